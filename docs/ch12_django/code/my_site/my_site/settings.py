@@ -122,3 +122,13 @@ STATIC_URL = "static/"
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+
+# Votes of the polls app, see polls/votes.py
+# 0 writes every vote at once, N > 0 writes the votes in batches of N.
+# A batch is also written when its oldest vote is older than
+# POLLS_VOTE_FLUSH_SECONDS, checked at the end of every request.
+# The results page shows the written votes plus the buffered ones.
+
+POLLS_VOTE_BUFFER_SIZE = 0
+POLLS_VOTE_FLUSH_SECONDS = 1.0
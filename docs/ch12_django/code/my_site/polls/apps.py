@@ -1,6 +1,12 @@
 from django.apps import AppConfig
+from django.core.signals import request_finished
 
 
 class PollsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'polls'
+
+    def ready(self):
+        from .votes import flush_late_votes
+
+        request_finished.connect(flush_late_votes, dispatch_uid="polls_flush_votes")
@@ -1,10 +1,15 @@
 import datetime
+from unittest import mock
 
-from django.test import TestCase
+from django.db import OperationalError, connection
+from django.db.models import QuerySet
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
 
 from .models import Question
+from .votes import _pending, flush_votes, pending_votes
 
 
 class QuestionModelTests(TestCase):
@@ -124,3 +129,121 @@ class QuestionDetailViewTests(TestCase):
         url = reverse("polls:detail", args=(past_question.id,))
         response = self.client.get(url)
         self.assertContains(response, past_question.question_text)
+
+
+class VoteViewTests(TestCase):
+    def setUp(self):
+        self.question = create_question(question_text="Past question.", days=-5)
+        self.choice = self.question.choice_set.create(choice_text="Yes")
+        self.url = reverse("polls:vote", args=(self.question.id,))
+        # the vote buffer is global to the process, start and end empty
+        _pending.clear()
+        self.addCleanup(_pending.clear)
+
+    def test_vote(self):
+        """
+        A vote adds one to the votes of the selected choice and redirects
+        to the results page.
+        """
+        response = self.client.post(self.url, {"choice": self.choice.id})
+        self.assertRedirects(
+            response, reverse("polls:results", args=(self.question.id,))
+        )
+        self.choice.refresh_from_db()
+        self.assertEqual(self.choice.votes, 1)
+
+    def test_vote_without_choice(self):
+        """
+        A vote without a choice redisplays the question with an error.
+        """
+        response = self.client.post(self.url)
+        self.assertContains(response, "You didn&#x27;t select a choice.")
+        self.choice.refresh_from_db()
+        self.assertEqual(self.choice.votes, 0)
+
+    def test_vote_updates_votes_column_only(self):
+        """
+        A vote is one UPDATE that adds one to the votes column in the
+        database, so concurrent votes are not lost.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(self.url, {"choice": self.choice.id})
+        updates = [
+            query["sql"] for query in queries if query["sql"].startswith("UPDATE")
+        ]
+        self.assertEqual(len(updates), 1)
+        self.assertIn('SET "votes" = ("polls_choice"."votes" + 1)', updates[0])
+        self.assertNotIn("choice_text", updates[0])
+
+    @override_settings(POLLS_VOTE_BUFFER_SIZE=3, POLLS_VOTE_FLUSH_SECONDS=60)
+    def test_buffered_votes(self):
+        """
+        With a vote buffer, the votes are written when the buffer is full.
+        """
+        other_choice = self.question.choice_set.create(choice_text="No")
+        self.client.post(self.url, {"choice": self.choice.id})
+        self.client.post(self.url, {"choice": other_choice.id})
+        self.choice.refresh_from_db()
+        self.assertEqual(self.choice.votes, 0)
+        self.assertEqual(pending_votes(), 2)
+
+        self.client.post(self.url, {"choice": self.choice.id})
+        self.choice.refresh_from_db()
+        other_choice.refresh_from_db()
+        self.assertEqual(self.choice.votes, 2)
+        self.assertEqual(other_choice.votes, 1)
+        self.assertEqual(pending_votes(), 0)
+
+    @override_settings(POLLS_VOTE_BUFFER_SIZE=10, POLLS_VOTE_FLUSH_SECONDS=60)
+    def test_flush_votes(self):
+        """
+        flush_votes() writes the pending votes at once.
+        """
+        self.client.post(self.url, {"choice": self.choice.id})
+        flush_votes()
+        self.choice.refresh_from_db()
+        self.assertEqual(self.choice.votes, 1)
+
+    @override_settings(POLLS_VOTE_BUFFER_SIZE=10, POLLS_VOTE_FLUSH_SECONDS=60)
+    def test_results_show_buffered_votes(self):
+        """
+        The results page shows the pending votes without writing them.
+        """
+        self.client.post(self.url, {"choice": self.choice.id})
+        self.assertEqual(pending_votes(), 1)
+        response = self.client.get(reverse("polls:results", args=(self.question.id,)))
+        self.assertContains(response, "Yes -- 1 vote")
+        self.assertEqual(pending_votes(), 1)
+        self.choice.refresh_from_db()
+        self.assertEqual(self.choice.votes, 0)
+
+    @override_settings(POLLS_VOTE_BUFFER_SIZE=10, POLLS_VOTE_FLUSH_SECONDS=0)
+    def test_late_votes_flushed_after_request(self):
+        """
+        The pending votes older than POLLS_VOTE_FLUSH_SECONDS are written at
+        the end of any request.
+        """
+        with override_settings(POLLS_VOTE_FLUSH_SECONDS=60):
+            self.client.post(self.url, {"choice": self.choice.id})
+        self.assertEqual(pending_votes(), 1)
+        self.client.get(reverse("polls:index"))
+        self.choice.refresh_from_db()
+        self.assertEqual(self.choice.votes, 1)
+        self.assertEqual(pending_votes(), 0)
+
+    @override_settings(POLLS_VOTE_BUFFER_SIZE=10, POLLS_VOTE_FLUSH_SECONDS=60)
+    def test_failed_flush_keeps_votes(self):
+        """
+        If the UPDATE of flush_votes() fails, the votes stay pending.
+        """
+        self.client.post(self.url, {"choice": self.choice.id})
+        with mock.patch.object(
+            QuerySet, "update", side_effect=OperationalError("database is locked")
+        ):
+            with self.assertRaises(OperationalError):
+                flush_votes()
+        self.assertEqual(pending_votes(), 1)
+
+        flush_votes()
+        self.choice.refresh_from_db()
+        self.assertEqual(self.choice.votes, 1)
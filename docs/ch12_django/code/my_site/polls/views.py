@@ -4,6 +4,7 @@ from django.urls import reverse
 from django.views import generic
 
 from .models import Choice, Question
+from .votes import count_vote, pending_counts
 
 
 class IndexView(generic.ListView):
@@ -24,6 +25,16 @@ class ResultsView(generic.DetailView):
     model = Question
     template_name = "polls/results.html"
 
+    def get_context_data(self, **kwargs):
+        """Add the buffered votes of this process to the written votes."""
+        context = super().get_context_data(**kwargs)
+        counts = pending_counts()
+        choices = list(self.object.choice_set.all())
+        for choice in choices:
+            choice.votes += counts.get(choice.pk, 0)
+        context["choices"] = choices
+        return context
+
 
 def vote(request, question_id):
     question = get_object_or_404(Question, pk=question_id)
@@ -41,7 +52,6 @@ def vote(request, question_id):
             },
         )
     else:
-        selected_choice.votes += 1
-        selected_choice.save()
+        count_vote(selected_choice.pk)
 
         return HttpResponseRedirect(reverse("polls:results", args=(question.id,)))
@@ -0,0 +1,116 @@
+import threading
+import time
+
+from django.conf import settings
+from django.db.models import Case, F, IntegerField, Value, When
+
+from .models import Choice
+
+_lock = threading.Lock()
+_pending = {}
+_first_pending_time = None
+
+
+def count_vote(choice_id):
+    """
+    Add one vote to the choice.
+
+    By default the vote is written at once with a single
+    `UPDATE ... SET votes = votes + 1`, so concurrent votes are never lost.
+    If POLLS_VOTE_BUFFER_SIZE is more than 0, the votes of this process are
+    added up in memory and written in one UPDATE when that many votes are
+    pending or the oldest one is older than POLLS_VOTE_FLUSH_SECONDS.
+    The age is also checked at the end of every request, see
+    flush_late_votes(). The results page adds the pending votes to the
+    written ones without writing them, see pending_counts().
+    The pending votes are lost if the process stops before they are written.
+    """
+    buffer_size = getattr(settings, "POLLS_VOTE_BUFFER_SIZE", 0)
+    if buffer_size <= 0:
+        Choice.objects.filter(pk=choice_id).update(votes=F("votes") + 1)
+        return
+
+    global _first_pending_time
+    with _lock:
+        _pending[choice_id] = _pending.get(choice_id, 0) + 1
+        if _first_pending_time is None:
+            _first_pending_time = time.monotonic()
+        full = sum(_pending.values()) >= buffer_size
+        late = _is_late()
+    if full or late:
+        flush_votes()
+
+
+def flush_late_votes(**kwargs):
+    """
+    Write the pending votes if the oldest one is older than
+    POLLS_VOTE_FLUSH_SECONDS.
+
+    Connected to the request_finished signal, so the buffered votes are
+    written even when no new vote comes in.
+    """
+    with _lock:
+        late = _is_late()
+    if late:
+        flush_votes()
+
+
+def _is_late():
+    """
+    Return True if the oldest pending vote is older than
+    POLLS_VOTE_FLUSH_SECONDS, the caller holds the lock.
+    """
+    if _first_pending_time is None:
+        return False
+    flush_seconds = getattr(settings, "POLLS_VOTE_FLUSH_SECONDS", 1.0)
+    return time.monotonic() - _first_pending_time >= flush_seconds
+
+
+def flush_votes():
+    """
+    Write the pending votes of all choices in one UPDATE.
+
+    If the UPDATE fails, e.g. with "database is locked", the votes are put
+    back into the buffer with their age and the error is raised again, so
+    the next flush writes them.
+    """
+    global _first_pending_time
+    with _lock:
+        counts = dict(_pending)
+        first_pending_time = _first_pending_time
+        _pending.clear()
+        _first_pending_time = None
+    if not counts:
+        return
+
+    try:
+        Choice.objects.filter(pk__in=counts).update(
+            votes=F("votes")
+            + Case(
+                *[When(pk=pk, then=Value(count)) for pk, count in counts.items()],
+                default=Value(0),
+                output_field=IntegerField(),
+            )
+        )
+    except Exception:
+        with _lock:
+            for pk, count in counts.items():
+                _pending[pk] = _pending.get(pk, 0) + count
+            _first_pending_time = first_pending_time
+        raise
+
+
+def pending_votes():
+    """
+    Return the number of votes that are not written yet.
+    """
+    with _lock:
+        return sum(_pending.values())
+
+
+def pending_counts():
+    """
+    Return a dict of the votes that are not written yet, by choice id.
+    """
+    with _lock:
+        return dict(_pending)
@@ -0,0 +1,452 @@
+"""benchmarks of the ch14_llm code
+
+`python benchmark.py suite` times every stage of the pipeline and measures its
+memory on corpora scaled from `names.txt`, saves the results and compares them
+with a baseline:
+
+    python benchmark.py suite --save baseline.json
+    python benchmark.py suite --baseline baseline.json
+
+`python benchmark.py sampler` and `python benchmark.py parallel` run the
+micro-benchmarks of the samplers and of the parallel training.
+`python benchmark.py quantize` compares the loss, the speed and the size of
+the quantized weights with float32, see `quantize.py`.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+import torch
+import torch.nn.functional as F
+
+import best_model
+from data import Data
+from instrumentation import peak_rss_mib, reset_peak_rss
+from mlp_data import DEV, TRAIN, MLPData
+from mlp_model import MLPLanguageModel
+from mlp_trainer import MLPTrainer
+from model import BigramLanguageModel
+from parallel import train_parallel
+from quantize import BFLOAT16, DTYPES, FLOAT32, QuantizedModel
+from trainer import Trainer
+
+NUM_NAMES = 2000
+MANUAL_SEED = 2147483647
+NUM_ITERATIONS = 20
+
+SCALES = [1, 10, 100]
+SUITE_NUM_NAMES = 10_000
+SUITE_BATCH_SIZE = 65_536
+SUITE_TRAIN_STEPS = 10
+EVAL_CHUNK_SIZE = 1 << 20
+TOLERANCE = 0.2
+MEMORY_TOLERANCE = 0.2
+MIN_REGRESSION_SECONDS = 0.01  # smaller changes are timer noise
+MIN_REGRESSION_MIB = 1.0  # smaller changes are allocator noise
+MLP_STEPS = 5000
+QUANTIZE_REPEAT = 5
+
+
+def time_it(function):
+    """run the function once, return its result and the seconds it takes"""
+    start = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - start
+
+
+def benchmark_samplers(bigram_prob, int_to_char, num_names=NUM_NAMES):
+    """compare the multinomial sampler and the alias sampler of best_model"""
+    (alias_prob, alias_index), build_seconds = time_it(
+        lambda: best_model.build_alias_table(bigram_prob)
+    )
+    print(f"alias table built in {build_seconds * 1000:.2f} ms")
+
+    samplers = {
+        best_model.MULTINOMIAL_SAMPLER: lambda generator: (
+            best_model.sample_names_multinomial(
+                bigram_prob, int_to_char, num_names, generator
+            )
+        ),
+        best_model.ALIAS_SAMPLER: lambda generator: best_model.sample_names_alias(
+            alias_prob, alias_index, int_to_char, num_names, generator
+        ),
+    }
+    for name, sampler in samplers.items():
+        generator = torch.Generator().manual_seed(MANUAL_SEED)
+        names, seconds = time_it(lambda: sampler(generator))
+        num_chars = sum(len(name) for name in names)
+        print(
+            f"{name:>12}: {num_names} names, {num_chars} chars in {seconds:.3f} s, "
+            f"{num_chars / seconds:,.0f} chars/s"
+        )
+
+
+def benchmark_parallel(core_counts, num_iterations=NUM_ITERATIONS, batch_size=None):
+    """report the training throughput against the number of cores
+
+    For each core count, the bigram trainer runs once in one process with that
+    many intra-op threads, and once sharded over that many worker processes
+    with one thread each.
+    """
+    data = Data(best_model.DATA_FILE)
+    num_bigrams = batch_size or len(data.get_training_data()[0])
+    default_threads = torch.get_num_threads()
+
+    print(f"{'cores':>5} {'threads bigrams/s':>18} {'processes bigrams/s':>20}")
+    for num_cores in core_counts:
+        model = BigramLanguageModel(data.vocab_size)
+        trainer = Trainer(data, model, batch_size=batch_size, num_threads=num_cores)
+        with contextlib.redirect_stdout(io.StringIO()):
+            _, thread_seconds = time_it(lambda: trainer.train(num_iterations))
+        # the time of the processes includes starting them
+        _, process_seconds = time_it(
+            lambda: train_parallel(
+                best_model.DATA_FILE, num_cores, num_iterations, batch_size
+            )
+        )
+
+        num_trained = num_bigrams * num_iterations
+        print(
+            f"{num_cores:>5} {num_trained / thread_seconds:>18,.0f} "
+            f"{num_trained / process_seconds:>20,.0f}"
+        )
+    torch.set_num_threads(default_threads)
+
+
+def write_scaled_corpus(file_name, scale):
+    """write `names.txt` repeated `scale` times, the vocabulary stays the same"""
+    with open(best_model.DATA_FILE, "rb") as file:
+        content = file.read()
+    if not content.endswith(b"\n"):
+        content += b"\n"
+    with open(file_name, "wb") as file:
+        for _ in range(scale):
+            file.write(content)
+
+
+def run_stages(stages, repeat):
+    """time each stage and measure its memory, keep the best of `repeat` runs
+
+    A stage is a function of the results of the earlier stages.
+    The memory of a stage is the peak RSS during the stage minus the RSS before
+    it, the memory the stage adds to the process, e.g. not the memory of the
+    torch import. It is None where the peak RSS can not be reset.
+    """
+    results = {}
+    values = {}
+    for name, stage in stages:
+        best_seconds = float("inf")
+        best_mib = None
+        for _ in range(repeat):
+            start_mib = reset_peak_rss()
+            with contextlib.redirect_stdout(io.StringIO()):
+                values[name], seconds = time_it(lambda stage=stage: stage(values))
+            best_seconds = min(best_seconds, seconds)
+            if start_mib is not None:
+                stage_mib = peak_rss_mib() - start_mib
+                best_mib = stage_mib if best_mib is None else min(best_mib, stage_mib)
+        results[name] = {"seconds": best_seconds, "peak_rss_increase_mib": best_mib}
+    return results
+
+
+def best_model_stages(file_name):
+    """the stages of the `best_model.py` pipeline"""
+    return [
+        ("best.read", lambda values: best_model.read_file(file_name)),
+        ("best.vocab", lambda values: best_model.build_vocab(values["best.read"])),
+        (
+            "best.counts",
+            lambda values: best_model.build_bigram_freq_batched(
+                values["best.read"], values["best.vocab"][0], values["best.vocab"][2]
+            ),
+        ),
+        (
+            "best.eval",
+            lambda values: best_model.eval_model_batched(
+                best_model.build_bigram_prob(values["best.counts"]),
+                values["best.read"],
+                values["best.vocab"][0],
+            ),
+        ),
+        (
+            "best.generate",
+            lambda values: best_model.sample_names_alias(
+                *best_model.build_alias_table(
+                    best_model.build_bigram_prob(values["best.counts"])
+                ),
+                values["best.vocab"][1],
+                SUITE_NUM_NAMES,
+                torch.Generator().manual_seed(MANUAL_SEED),
+            ),
+        ),
+    ]
+
+
+def bigram_eval(data, model):
+    """the loss of the model on all training data, in chunks without a graph"""
+    first_indexes, next_indexes = data.get_training_data()
+    total = 0.0
+    with torch.no_grad():
+        for start in range(0, len(first_indexes), EVAL_CHUNK_SIZE):
+            end = start + EVAL_CHUNK_SIZE
+            logits = model.logits(first_indexes[start:end])
+            total += F.cross_entropy(
+                logits, next_indexes[start:end], reduction="sum"
+            ).item()
+    return total / len(first_indexes)
+
+
+def bigram_model_stages(file_name):
+    """the stages of the `Data`, `BigramLanguageModel` and `Trainer` pipeline"""
+
+    def train(values):
+        data = values["model.vocab"]
+        model = BigramLanguageModel(data.vocab_size)
+        Trainer(data, model, batch_size=SUITE_BATCH_SIZE).train(SUITE_TRAIN_STEPS)
+        return model
+
+    return [
+        ("model.vocab", lambda values: Data(file_name)),
+        ("model.encode", lambda values: values["model.vocab"].get_training_data()),
+        ("model.train", train),
+        (
+            "model.eval",
+            lambda values: bigram_eval(values["model.vocab"], values["model.train"]),
+        ),
+        (
+            "model.generate",
+            lambda values: values["model.train"].sample_names(
+                SUITE_NUM_NAMES,
+                values["model.vocab"].int_to_char,
+                best_model.START_END,
+            ),
+        ),
+    ]
+
+
+def benchmark_scale(scale, repeat):
+    """run all stages on one scaled corpus, in its own process"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        file_name = os.path.join(temp_dir, f"names_{scale}x.txt")
+        write_scaled_corpus(file_name, scale)
+        results = run_stages(best_model_stages(file_name), repeat)
+        results.update(run_stages(bigram_model_stages(file_name), repeat))
+    return results
+
+
+def benchmark_suite(scales, repeat=1):
+    """run the suite on each scale, each scale in a new process
+
+    A new process for each scale keeps the memory freed by a scale from
+    being reused by the next one, which would hide its memory.
+    """
+    context = multiprocessing.get_context("spawn")
+    results = {}
+    for scale in scales:
+        with context.Pool(1) as pool:
+            results[f"{scale}x"] = pool.apply(benchmark_scale, (scale, repeat))
+        for stage, result in results[f"{scale}x"].items():
+            memory = result["peak_rss_increase_mib"]
+            memory = "n/a" if memory is None else f"{memory:.1f}"
+            print(
+                f"{scale:>4}x {stage:<15} {result['seconds']:>10.4f} s "
+                f"{memory:>10} MiB"
+            )
+    return results
+
+
+def is_regression(value, base, tolerance, min_change):
+    """True if `value` is more than `tolerance` and `min_change` above `base`"""
+    if value is None or base is None:
+        return False
+    ratio = value / base if base else 1.0
+    return ratio > 1 + tolerance and value - base > min_change
+
+
+def compare_results(
+    results, baseline, tolerance=TOLERANCE, memory_tolerance=MEMORY_TOLERANCE
+):
+    """print the stages that are slower or use more memory than the baseline,
+    return their count"""
+    num_regressions = 0
+    for scale, stages in results.items():
+        for stage, result in stages.items():
+            base = baseline.get(scale, {}).get(stage)
+            if base is None:
+                continue
+            if is_regression(
+                result["seconds"], base["seconds"], tolerance, MIN_REGRESSION_SECONDS
+            ):
+                num_regressions += 1
+                print(
+                    f"REGRESSION {scale} {stage}: {base['seconds']:.4f} s -> "
+                    f"{result['seconds']:.4f} s"
+                )
+            memory = result.get("peak_rss_increase_mib")
+            base_memory = base.get("peak_rss_increase_mib")
+            if is_regression(memory, base_memory, memory_tolerance, MIN_REGRESSION_MIB):
+                num_regressions += 1
+                print(
+                    f"REGRESSION {scale} {stage}: {base_memory:.1f} MiB -> "
+                    f"{memory:.1f} MiB"
+                )
+    if num_regressions == 0:
+        print(
+            f"no stage is more than {tolerance:.0%} slower or uses more than "
+            f"{memory_tolerance:.0%} more memory than the baseline"
+        )
+    return num_regressions
+
+
+def model_nbytes(model):
+    """the bytes of the float32 tensors of a model"""
+    return sum(
+        tensor.element_size() * tensor.nelement()
+        for tensor in model.state_dict().values()
+    )
+
+
+def nll_and_speed(model, inputs, targets):
+    """the average negative log likelihood and the tokens per second"""
+    seconds = float("inf")
+    for _ in range(QUANTIZE_REPEAT):
+        start = time.perf_counter()
+        with torch.no_grad():
+            nll = F.cross_entropy(model.logits(inputs), targets).item()
+        seconds = min(seconds, time.perf_counter() - start)
+    return nll, len(targets) / seconds
+
+
+def accuracy_report(name, model, inputs, targets):
+    """print the NLL, the tokens per second and the bytes of each storage type
+
+    A quantized model is dequantized to float32 on every call, its tokens per
+    second include the dequantization, there is no int8 or float16 compute.
+    """
+    nll, tokens_per_second = nll_and_speed(model, inputs, targets)
+    print(
+        f"{name} {FLOAT32:>8}: nll {nll:.4f}, "
+        f"{tokens_per_second / 1e6:7.2f} M tokens/s, {model_nbytes(model):>8} bytes"
+    )
+    for dtype in DTYPES:
+        quantized = QuantizedModel.quantize(model, dtype)
+        quantized_nll, tokens_per_second = nll_and_speed(quantized, inputs, targets)
+        print(
+            f"{name} {dtype:>8}: nll {quantized_nll:.4f} ({quantized_nll - nll:+.4f}), "
+            f"{tokens_per_second / 1e6:7.2f} M tokens/s, "
+            f"{quantized.nbytes():>8} bytes"
+        )
+
+
+def benchmark_quantized_bigram():
+    """the report of the counted bigram probability table"""
+    data = Data(best_model.DATA_FILE)
+    vocab_size = data.vocab_size
+    first_indexes, next_indexes = data.get_training_data()
+    bigram_freq = torch.bincount(
+        first_indexes * vocab_size + next_indexes, minlength=vocab_size**2
+    ).view(vocab_size, vocab_size)
+    # the same add-one smoothing as `best_model.build_bigram_prob`
+    bigram_prob = (bigram_freq + 1) / (bigram_freq + 1).sum(dim=1, keepdim=True)
+
+    model = BigramLanguageModel(vocab_size)
+    model.load_state_dict({"weights": bigram_prob.log()})
+    accuracy_report("bigram", model, first_indexes, next_indexes)
+
+
+def benchmark_quantized_mlp(num_steps):
+    """the report of an MLP trained in float32 and with bfloat16 autocast"""
+    data = MLPData(best_model.DATA_FILE)
+    contexts, next_indexes = data.get_split(DEV)
+    for autocast_dtype in (None, torch.bfloat16):
+        model = MLPLanguageModel(data.vocab_size, data.block_size)
+        trainer = MLPTrainer(data, model, autocast_dtype=autocast_dtype)
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            trainer.train(num_steps, log_every=num_steps)
+        seconds = time.perf_counter() - start
+        training = FLOAT32 if autocast_dtype is None else BFLOAT16
+        print(
+            f"mlp trained in {training}: "
+            f"{num_steps * trainer.batch_size / seconds / 1e3:.1f} K tokens/s, "
+            f"train loss {trainer.evaluate(TRAIN):.4f}, "
+            f"dev loss {trainer.evaluate(DEV):.4f}"
+        )
+        accuracy_report(f"mlp ({training} training)", model, contexts, next_indexes)
+
+
+def benchmark_quantization(mlp_steps=MLP_STEPS):
+    """compare the quantized weights with float32 and bfloat16 training"""
+    print("quantized weights are dequantized to float32 on every call")
+    benchmark_quantized_bigram()
+    benchmark_quantized_mlp(mlp_steps)
+
+
+def main():
+    """main function"""
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "benchmark", choices=["suite", "sampler", "parallel", "quantize"]
+    )
+    parser.add_argument(
+        "--scales", type=int, nargs="+", default=SCALES, help="the corpus scales"
+    )
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--save", help="save the suite results to a JSON file")
+    parser.add_argument("--baseline", help="compare the suite with a JSON file")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    parser.add_argument("--memory-tolerance", type=float, default=MEMORY_TOLERANCE)
+    parser.add_argument(
+        "--cores",
+        type=int,
+        nargs="+",
+        default=[1, 2, 4, os.cpu_count()],
+        help="the core counts of the parallel benchmark",
+    )
+    parser.add_argument("--batch-size", type=int, default=None)
+    parser.add_argument(
+        "--mlp-steps", type=int, default=MLP_STEPS, help="the MLP training steps"
+    )
+    args = parser.parse_args()
+
+    if args.benchmark == "suite":
+        results = benchmark_suite(args.scales, args.repeat)
+        if args.save:
+            with open(args.save, "w", encoding="utf-8") as file:
+                json.dump(results, file, indent=2)
+        if args.baseline:
+            with open(args.baseline, encoding="utf-8") as file:
+                baseline = json.load(file)
+            if compare_results(
+                results, baseline, args.tolerance, args.memory_tolerance
+            ):
+                sys.exit(1)
+        return
+
+    if args.benchmark == "parallel":
+        benchmark_parallel(sorted(set(args.cores)), batch_size=args.batch_size)
+        return
+
+    if args.benchmark == "quantize":
+        benchmark_quantization(args.mlp_steps)
+        return
+
+    names = best_model.read_file(best_model.DATA_FILE)
+    char_to_int, int_to_char, vocab_size = best_model.build_vocab(names)
+    bigram_freq = best_model.build_bigram_freq_batched(names, char_to_int, vocab_size)
+    bigram_prob = best_model.build_bigram_prob(bigram_freq)
+
+    benchmark_samplers(bigram_prob, int_to_char)
+
+
+if __name__ == "__main__":
+    main()
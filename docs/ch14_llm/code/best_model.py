@@ -4,10 +4,17 @@ the best model for the bigram prediction
 
 # pylint: disable=C0103 # constant variable name is in upper case
 
+import itertools
+
 import torch
 from matplotlib import pyplot as plt
 
+from checkpoint import save_bigram_prob
+from corpus import MappedNames, encode_text
+from scoring import score_strings, top_k
+
 DATA_FILE = "names.txt"
+CHECKPOINT_FILE = "best_model.pt"
 READ_MODE = "r"
 ENCODING = "utf-8"
 
@@ -20,6 +27,16 @@ def read_file(file_name):
         return file.read().splitlines()
 
 
+def read_file_streaming(file_name):
+    """read the file lazily from a memory map, for files too large for a list
+
+    The names can be iterated many times, for example by `eval_model_streaming`.
+    Use `corpus.build_bigram_freq_streaming` to build the vocabulary and the
+    bigram frequency of the file in one pass.
+    """
+    return MappedNames(file_name)
+
+
 def build_vocab(names):
     """build the vocabulary"""
     chars = sorted(list(set("".join(names))))
@@ -45,6 +62,34 @@ def build_bigram_freq(names, char_to_int, vocab_size):
     return bigram_freq
 
 
+def encode_names(names, char_to_int):
+    """encode the whole corpus into one index tensor
+
+    The names are joined by `START_END` into one sequence like `.emma.olivia.`.
+    Each pair of neighbours in the sequence is one bigram used by `build_bigram_freq`,
+    so the first indexes are `indexes[:-1]` and the next indexes are `indexes[1:]`.
+    """
+    text = START_END + START_END.join(names) + START_END
+    return encode_text(text, char_to_int)
+
+
+def build_bigram_freq_batched(names, char_to_int, vocab_size):
+    """build the bigram frequency with one bincount call
+
+    It gives the same int32 matrix as `build_bigram_freq` without a Python loop.
+    Each bigram `(first, next)` is flattened to `first * vocab_size + next`,
+    counted by `torch.bincount`, then reshaped back to a `vocab_size x vocab_size` matrix.
+    """
+    if not names:
+        return torch.zeros((vocab_size, vocab_size), dtype=torch.int32)
+
+    indexes = encode_names(names, char_to_int)
+    bigram_codes = indexes[:-1] * vocab_size + indexes[1:]
+    bigram_freq = torch.bincount(bigram_codes, minlength=vocab_size * vocab_size)
+
+    return bigram_freq.view(vocab_size, vocab_size).to(torch.int32)
+
+
 def plot_bigram(bigram_freq, int_to_char):
     """plot the bigram frequency matrix"""
 
@@ -88,13 +133,14 @@ def build_bigram_prob(bigram_freq):
 NUM_NAMES = 10
 MANUAL_SEED = 2147483647
 
+MULTINOMIAL_SAMPLER = "multinomial"
+ALIAS_SAMPLER = "alias"
 
-def generate_names(bigram_prob, int_to_char):
-    """generate names based on the bigram probability"""
 
-    generator = torch.Generator().manual_seed(MANUAL_SEED)
-
-    for _ in range(NUM_NAMES):
+def sample_names_multinomial(bigram_prob, int_to_char, num_names, generator):
+    """sample names one character at a time with `torch.multinomial`"""
+    names = []
+    for _ in range(num_names):
         out = []
         index = 0
         while True:
@@ -104,7 +150,88 @@ def generate_names(bigram_prob, int_to_char):
             if next_char == START_END:
                 break
 
-        print("".join(out))
+        names.append("".join(out))
+
+    return names
+
+
+def build_alias_table(bigram_prob):
+    """build the Walker/Vose alias table of each row of the bigram probability
+
+    Each row of `vocab_size` columns is split into `vocab_size` equal buckets.
+    The bucket `column` keeps the character `column` with the probability
+    `alias_prob[row, column]`, otherwise it gives the character `alias_index[row, column]`.
+    A character is then drawn in O(1) with one random bucket and one random coin.
+    """
+    vocab_size = bigram_prob.shape[1]
+    alias_prob = [[1.0] * vocab_size for _ in range(vocab_size)]
+    alias_index = [list(range(vocab_size)) for _ in range(vocab_size)]
+
+    for row in range(vocab_size):
+        scaled = (bigram_prob[row] * vocab_size / bigram_prob[row].sum()).tolist()
+        small = [column for column, prob in enumerate(scaled) if prob < 1]
+        large = [column for column, prob in enumerate(scaled) if prob >= 1]
+        while small and large:
+            small_column = small.pop()
+            large_column = large.pop()
+            alias_prob[row][small_column] = scaled[small_column]
+            alias_index[row][small_column] = large_column
+            scaled[large_column] += scaled[small_column] - 1
+            if scaled[large_column] < 1:
+                small.append(large_column)
+            else:
+                large.append(large_column)
+        # the columns left in either list keep the probability 1
+
+    return torch.tensor(alias_prob), torch.tensor(alias_index)
+
+
+def sample_names_alias(alias_prob, alias_index, int_to_char, num_names, generator):
+    """sample names with the alias table, all names advance together
+
+    Each step draws a bucket and a coin for every unfinished name,
+    the finished names are removed from the batch.
+    """
+    vocab_size = alias_prob.shape[1]
+    outs = [[] for _ in range(num_names)]
+    rows = torch.arange(num_names)
+    indexes = torch.zeros(num_names, dtype=torch.long)
+
+    while len(rows) > 0:
+        buckets = torch.randint(vocab_size, (len(rows),), generator=generator)
+        coins = torch.rand(len(rows), generator=generator)
+        keep = coins < alias_prob[indexes, buckets]
+        indexes = torch.where(keep, buckets, alias_index[indexes, buckets])
+
+        for row, index in zip(rows.tolist(), indexes.tolist()):
+            outs[row].append(int_to_char[index])
+
+        running = indexes != 0
+        rows = rows[running]
+        indexes = indexes[running]
+
+    return ["".join(out) for out in outs]
+
+
+def generate_names(bigram_prob, int_to_char, sampler=MULTINOMIAL_SAMPLER):
+    """generate names based on the bigram probability
+
+    The `multinomial` sampler calls `torch.multinomial` for every character.
+    The `alias` sampler builds an alias table once and draws each character in O(1).
+    """
+
+    generator = torch.Generator().manual_seed(MANUAL_SEED)
+
+    if sampler == ALIAS_SAMPLER:
+        alias_prob, alias_index = build_alias_table(bigram_prob)
+        names = sample_names_alias(
+            alias_prob, alias_index, int_to_char, NUM_NAMES, generator
+        )
+    else:
+        names = sample_names_multinomial(bigram_prob, int_to_char, NUM_NAMES, generator)
+
+    for name in names:
+        print(name)
 
 
 def eval_model(bigram_prob, names, char_to_int):
@@ -137,19 +264,96 @@ def eval_model(bigram_prob, names, char_to_int):
     return nll / num_pairs
 
 
+def eval_model_batched(bigram_prob, names, char_to_int):
+    """the model quality computed with one index operation
+
+    The probabilities of all pairs are gathered at once from the encoded corpus.
+    Each name has `len(name) + 1` pairs, so the pairs are summed back to their names
+    with `index_add_`.
+
+    Return the `nll` of each name and the `nll` of the whole corpus,
+    the corpus `nll` is the value of `eval_model`, summed in double precision.
+    """
+    if not names:
+        return torch.zeros(0), torch.tensor(float("nan"))
+
+    name_nll, pair_nll = _eval_pairs(bigram_prob, names, char_to_int)
+    return name_nll.float(), pair_nll.mean().float()
+
+
+def _eval_pairs(bigram_prob, names, char_to_int):
+    """the double precision `nll` of each name and of each pair"""
+    indexes = encode_names(names, char_to_int)
+    pair_nll = -torch.log(bigram_prob[indexes[:-1], indexes[1:]]).double()
+
+    num_pairs = torch.tensor([len(name) + 1 for name in names])
+    name_ids = torch.repeat_interleave(torch.arange(len(names)), num_pairs)
+    name_nll = torch.zeros(len(names), dtype=torch.double)
+    name_nll.index_add_(0, name_ids, pair_nll)
+    name_nll /= num_pairs
+
+    return name_nll, pair_nll
+
+
+EVAL_CHUNK_SIZE = 100_000
+
+
+def eval_model_streaming(bigram_prob, names, char_to_int, chunk_size=EVAL_CHUNK_SIZE):
+    """the model quality of a corpus that is too large to encode at once
+
+    `names` can be any iterable, for example a file object or the names of
+    `read_file_streaming`, the line endings are removed from the names.
+    Only `chunk_size` names are encoded at a time.
+    Return the average `nll` of the names and the `nll` of the whole corpus.
+    """
+    names = (name.rstrip("\r\n") for name in names)
+    total_name_nll = 0.0
+    total_pair_nll = 0.0
+    num_names = 0
+    num_pairs = 0
+
+    while True:
+        chunk = list(itertools.islice(names, chunk_size))
+        if not chunk:
+            break
+        name_nll, pair_nll = _eval_pairs(bigram_prob, chunk, char_to_int)
+        total_name_nll += name_nll.sum().item()
+        total_pair_nll += pair_nll.sum().item()
+        num_names += len(chunk)
+        num_pairs += len(pair_nll)
+
+    if num_names == 0:
+        return float("nan"), float("nan")
+    return total_name_nll / num_names, total_pair_nll / num_pairs
+
+
+def score_names(bigram_prob, names, char_to_int, average=False):
+    """the log-likelihood of each name, in one vectorised pass
+
+    The names with a character out of the vocabulary get `-inf`.
+    """
+    return score_strings(bigram_prob.log(), names, char_to_int, START_END, average)
+
+
+def top_k_names(bigram_prob, names, char_to_int, k, average=False):
+    """the `k` most plausible names, as (name, log-likelihood) pairs"""
+    return top_k(names, score_names(bigram_prob, names, char_to_int, average), k)
+
+
 def main():
     """main function"""
     names = read_file(DATA_FILE)
     char_to_int, int_to_char, vocab_size = build_vocab(names)
 
-    bigram_freq = build_bigram_freq(names, char_to_int, vocab_size)
+    bigram_freq = build_bigram_freq_batched(names, char_to_int, vocab_size)
     # plot_bigram(bigram_freq, int_to_char)
 
     bigram_prob = build_bigram_prob(bigram_freq)
+    save_bigram_prob(CHECKPOINT_FILE, bigram_prob, int_to_char)
     generate_names(bigram_prob, int_to_char)
 
-    loss = eval_model(bigram_prob, names, char_to_int)
-    print(f"Loss: {loss}")
+    name_loss, loss = eval_model_batched(bigram_prob, names, char_to_int)
+    print(f"Loss: {loss}, average name loss: {name_loss.mean()}")
 
 
 if __name__ == "__main__":
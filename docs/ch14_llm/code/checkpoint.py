@@ -0,0 +1,97 @@
+"""module to save and load the checkpoints of the models."""
+
+import torch
+
+from mlp_model import MLPLanguageModel
+from model import BigramLanguageModel
+from quantize import QuantizedModel, QuantizedTensor
+
+MODEL_CLASSES = {
+    "bigram": BigramLanguageModel,
+    "mlp": MLPLanguageModel,
+}
+
+
+def save_checkpoint(file_name, model, int_to_char, trainer=None):
+    """save the vocabulary, the model and the training state
+
+    The checkpoint only has strings, numbers and tensors, it is saved in the
+    zip format of `torch.save` that can be loaded with memory mapping.
+    The vocabulary is saved as one string, the character of index `i` is at `i`.
+    """
+    model_type = next(
+        name for name, cls in MODEL_CLASSES.items() if isinstance(model, cls)
+    )
+    checkpoint = {
+        "model_type": model_type,
+        "vocab": "".join(int_to_char[index] for index in range(len(int_to_char))),
+        "config": model.config(),
+        "state": {
+            name: tensor.contiguous() for name, tensor in model.state_dict().items()
+        },
+        "trainer": trainer.state_dict() if trainer is not None else {},
+    }
+    torch.save(checkpoint, file_name)
+
+
+def save_quantized_checkpoint(file_name, model, int_to_char, dtype):
+    """save the vocabulary and the model with its weights quantized to `dtype`,
+    see `quantize.py`
+
+    The model can be a `QuantizedModel` or a float32 model that is quantized here.
+    """
+    if not isinstance(model, QuantizedModel):
+        model = QuantizedModel.quantize(model, dtype)
+    model_type = next(
+        name for name, cls in MODEL_CLASSES.items() if cls is model.model_class
+    )
+    checkpoint = {
+        "model_type": model_type,
+        "vocab": "".join(int_to_char[index] for index in range(len(int_to_char))),
+        "config": model.config,
+        "quantized_state": {
+            name: tensor.state_dict() for name, tensor in model.state.items()
+        },
+        "trainer": {},
+    }
+    torch.save(checkpoint, file_name)
+
+
+def save_bigram_prob(file_name, bigram_prob, int_to_char):
+    """save the bigram probability of `best_model` as a bigram model checkpoint
+
+    The softmax of the log probability of a row is the row itself,
+    so the log probability works as the weights of `BigramLanguageModel`.
+    """
+    model = BigramLanguageModel(len(bigram_prob))
+    model.load_state_dict({"weights": bigram_prob.log()})
+    save_checkpoint(file_name, model, int_to_char)
+
+
+def load_checkpoint(file_name, dequantize=True):
+    """load a checkpoint, return the model, `char_to_int`, `int_to_char`
+    and the training state
+
+    The tensors are memory mapped from the file instead of being read into memory.
+    The model of a quantized checkpoint is turned back into a float32 model,
+    set `dequantize=False` to get the `QuantizedModel` instead.
+    """
+    checkpoint = torch.load(file_name, mmap=True, weights_only=True)
+
+    int_to_char = dict(enumerate(checkpoint["vocab"]))
+    char_to_int = {char: index for index, char in int_to_char.items()}
+
+    model_class = MODEL_CLASSES[checkpoint["model_type"]]
+    if "quantized_state" in checkpoint:
+        state = {
+            name: QuantizedTensor.from_state_dict(tensor)
+            for name, tensor in checkpoint["quantized_state"].items()
+        }
+        model = QuantizedModel(model_class, checkpoint["config"], state)
+        if dequantize:
+            model = model.dequantize()
+    else:
+        model = model_class(**checkpoint["config"])
+        model.load_state_dict(checkpoint["state"])
+
+    return model, char_to_int, int_to_char, checkpoint["trainer"]
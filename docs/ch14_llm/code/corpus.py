@@ -0,0 +1,245 @@
+"""module to stream a large corpus file
+
+The file is memory mapped and read in chunks of whole lines, so the names are
+never held as one list of Python strings. Lines end with `\\n` or `\\r\\n`.
+"""
+
+import hashlib
+import mmap
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import torch
+
+ENCODING = "utf-8"
+START_END = "."
+CHUNK_SIZE = 1 << 24  # bytes
+
+
+def _map_file(file):
+    """memory map a file object, None for an empty file"""
+    if file.seek(0, 2) == 0:
+        return None
+    return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def iter_chunks(file_name, chunk_size=CHUNK_SIZE, start=0, end=None):
+    """yield the names of the file in lists of about `chunk_size` bytes
+
+    Only the bytes from `start` to `end` are read, `start` must be the
+    beginning of a line and `end` must be the end of a line or of the file.
+    """
+    with open(file_name, "rb") as file:
+        mapped = _map_file(file)
+        if mapped is None:
+            return
+        with mapped:
+            end = len(mapped) if end is None else end
+            position = start
+            while position < end:
+                chunk_end = min(position + chunk_size, end)
+                if chunk_end < end:
+                    line_end = mapped.rfind(b"\n", position, chunk_end)
+                    if line_end < 0:
+                        line_end = mapped.find(b"\n", chunk_end, end)
+                    chunk_end = end if line_end < 0 else line_end + 1
+                yield mapped[position:chunk_end].decode(ENCODING).splitlines()
+                position = chunk_end
+
+
+def iter_names(file_name, chunk_size=CHUNK_SIZE):
+    """yield the names of the file one by one"""
+    for names in iter_chunks(file_name, chunk_size):
+        yield from names
+
+
+class MappedNames:
+    """the names of a file that can be iterated many times without a list"""
+
+    def __init__(self, file_name, chunk_size=CHUNK_SIZE):
+        self.file_name = file_name
+        self.chunk_size = chunk_size
+
+    def __iter__(self):
+        return iter_names(self.file_name, self.chunk_size)
+
+    def chunks(self):
+        """the names in lists of about `chunk_size` bytes"""
+        return iter_chunks(self.file_name, self.chunk_size)
+
+
+def hash_file(file_name):
+    """the SHA-256 of the file content, read through the memory map"""
+    digest = hashlib.sha256()
+    with open(file_name, "rb") as file:
+        mapped = _map_file(file)
+        if mapped is not None:
+            with mapped:
+                digest.update(mapped)
+    return digest.hexdigest()
+
+
+def build_vocab_from_chars(chars):
+    """build the vocabulary the same way as `best_model.build_vocab`"""
+    chars = sorted(chars)
+    char_to_int = {char: index + 1 for index, char in enumerate(chars)}
+    char_to_int[START_END] = 0
+    int_to_char = {index: char for char, index in char_to_int.items()}
+    vocab_size = len(char_to_int)
+
+    return char_to_int, int_to_char, vocab_size
+
+
+def _code_points(text):
+    """the code points of the text as one tensor"""
+    if not text:
+        return torch.zeros(0, dtype=torch.long)
+    return torch.frombuffer(
+        bytearray(text.encode("utf-32-le")), dtype=torch.int32
+    ).long()
+
+
+def encode_text(text, char_to_int, unknown_index=None):
+    """encode a text into one index tensor
+
+    The characters are converted to code points in one step with the UTF-32
+    encoding, then a lookup table maps code points to vocabulary indexes.
+    A character out of the vocabulary raises a `KeyError`, or gets
+    `unknown_index` if it is given.
+    """
+    code_points = _code_points(text)
+    if len(code_points) == 0:
+        return code_points
+
+    vocab_points = torch.tensor([ord(char) for char in char_to_int])
+    vocab_indexes = torch.tensor(list(char_to_int.values()))
+    lookup_size = max(code_points.max().item(), vocab_points.max().item()) + 1
+    lookup = torch.full((lookup_size,), -1, dtype=torch.long)
+    lookup[vocab_points] = vocab_indexes
+
+    indexes = lookup[code_points]
+    unknown = indexes < 0
+    if unknown_index is not None:
+        return indexes.masked_fill_(unknown, unknown_index)
+    if unknown.any():
+        # one code point is one character of a Python string
+        raise KeyError(text[unknown.nonzero()[0].item()])
+    return indexes
+
+
+def _merge_counts(keys, counts, new_keys, new_counts):
+    """add the new counts to the sorted keys and counts"""
+    keys, inverse = torch.unique(torch.cat([keys, new_keys]), return_inverse=True)
+    merged = torch.zeros(len(keys), dtype=torch.long)
+    merged.index_add_(0, inverse, torch.cat([counts, new_counts]))
+    return keys, merged
+
+
+CODE_POINT_BITS = 21  # every Unicode code point is below 2 ** 21
+
+
+def count_chunks(chunks):
+    """count the characters and the bigrams of the names in one pass
+
+    The vocabulary is not known before the end, so each bigram is kept as the
+    pair of its code points `first << 21 | next`. Return the sorted code points
+    of the characters and the sorted bigram keys with their counts.
+    """
+    chars = torch.zeros(0, dtype=torch.long)
+    keys = torch.zeros(0, dtype=torch.long)
+    counts = torch.zeros(0, dtype=torch.long)
+
+    for names in chunks:
+        if not names:
+            continue
+        chars = torch.unique(torch.cat([chars, _code_points("".join(names))]))
+
+        code_points = _code_points(START_END + START_END.join(names) + START_END)
+        pair_keys = code_points[:-1] << CODE_POINT_BITS | code_points[1:]
+        new_keys, new_counts = torch.unique(pair_keys, return_counts=True)
+        keys, counts = _merge_counts(keys, counts, new_keys, new_counts)
+
+    return chars, keys, counts
+
+
+def build_bigram_freq_from_counts(chars, keys, counts):
+    """build the vocabulary and the bigram frequency from `count_chunks`
+
+    Return the same `char_to_int`, `int_to_char`, `vocab_size` and int32 bigram
+    frequency as `best_model.build_vocab` and `best_model.build_bigram_freq`.
+    """
+    char_to_int, int_to_char, vocab_size = build_vocab_from_chars(
+        chr(code_point) for code_point in chars.tolist()
+    )
+
+    # there are at most vocab_size ** 2 distinct bigrams, a dict is fast enough
+    lookup = {ord(char): index for char, index in char_to_int.items()}
+    first_points = (keys >> CODE_POINT_BITS).tolist()
+    next_points = (keys & ((1 << CODE_POINT_BITS) - 1)).tolist()
+    first_indexes = torch.tensor([lookup[point] for point in first_points])
+    next_indexes = torch.tensor([lookup[point] for point in next_points])
+
+    bigram_freq = torch.zeros((vocab_size, vocab_size), dtype=torch.long)
+    if len(keys) > 0:
+        bigram_freq.index_put_((first_indexes, next_indexes), counts, accumulate=True)
+
+    return char_to_int, int_to_char, vocab_size, bigram_freq.to(torch.int32)
+
+
+def build_bigram_freq_streaming(file_name, chunk_size=CHUNK_SIZE):
+    """build the vocabulary and the bigram frequency of a file in one pass"""
+    chars, keys, counts = count_chunks(iter_chunks(file_name, chunk_size))
+    return build_bigram_freq_from_counts(chars, keys, counts)
+
+
+def split_byte_ranges(file_name, num_parts):
+    """split the file into about `num_parts` byte ranges of whole lines"""
+    with open(file_name, "rb") as file:
+        mapped = _map_file(file)
+        if mapped is None:
+            return []
+        with mapped:
+            size = len(mapped)
+            starts = [0]
+            for part in range(1, num_parts):
+                # a range starts after the end of the line around the split point
+                line_end = mapped.find(b"\n", size * part // num_parts - 1)
+                start = size if line_end < 0 else line_end + 1
+                if starts[-1] < start < size:
+                    starts.append(start)
+
+    return list(zip(starts, starts[1:] + [size]))
+
+
+def _count_range(file_name, start, end, chunk_size):
+    """count the characters and the bigrams of one byte range in a worker"""
+    return count_chunks(iter_chunks(file_name, chunk_size, start, end))
+
+
+def build_bigram_freq_parallel(file_name, num_workers=None, chunk_size=CHUNK_SIZE):
+    """build the vocabulary and the bigram frequency with a process pool
+
+    The file is split into one byte range of whole lines for each worker,
+    each worker counts its characters and bigrams, then the counts are merged.
+    The result is the same as `build_bigram_freq_streaming`.
+    """
+    num_workers = num_workers or os.cpu_count()
+    ranges = split_byte_ranges(file_name, num_workers)
+
+    chars = torch.zeros(0, dtype=torch.long)
+    keys = torch.zeros(0, dtype=torch.long)
+    counts = torch.zeros(0, dtype=torch.long)
+    # spawn instead of fork, a forked PyTorch thread pool can hang
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(len(ranges) or 1, mp_context=context) as pool:
+        futures = [
+            pool.submit(_count_range, file_name, start, end, chunk_size)
+            for start, end in ranges
+        ]
+        for future in futures:
+            range_chars, range_keys, range_counts = future.result()
+            chars = torch.unique(torch.cat([chars, range_chars]))
+            keys, counts = _merge_counts(keys, counts, range_keys, range_counts)
+
+    return build_bigram_freq_from_counts(chars, keys, counts)
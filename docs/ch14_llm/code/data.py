@@ -1,29 +1,102 @@
 """module to handle the data"""
 
+import hashlib
+import os
+import random
+
 import torch
 
-READ_MODE = "r"
+from corpus import MappedNames, encode_text, hash_file
+
+READ_MODE = "rb"
 ENCODING = "utf-8"
 
 START_END = "."
 
+CACHE_SUFFIX = ".pt"
+
+SPLIT_SEED = 42
+TRAIN_RATIO = 0.8
+DEV_RATIO = 0.1
+
+TRAIN = "train"
+DEV = "dev"
+TEST = "test"
+
 
 class Data:
-    """class to handle the data"""
+    """class to handle the data
+
+    The training data is encoded once and kept in memory for later calls.
+    If `cache_dir` is given, the encoded tensors are also saved to a file
+    keyed by the hash of the source file, so that later runs skip the encoding.
+
+    If `stream` is True, the names are not read into a list, `names` is a
+    `MappedNames` that reads the memory-mapped file lazily in chunks.
+    The vocabulary and the training data are built chunk by chunk.
 
-    def __init__(self, file_name):
+    `get_split` gives the bigrams of the shuffled train, dev and test names,
+    for example to stop the training when the dev loss stops improving.
+    """
+
+    def __init__(self, file_name, cache_dir=None, stream=False):
         self.file_name = file_name
-        self.names = self._read_file()
+        self.cache_dir = cache_dir
+        self.stream = stream
+        self._training_data = None
+        # names is assigned first, it resets the file hash of the old names
+        self.names, self.file_hash = self._read_file()
         self.char_to_int, self.int_to_char, self.vocab_size = self._build_vocab()
 
+    @property
+    def names(self):
+        """the names in the data"""
+        return self._names
+
+    @names.setter
+    def names(self, names):
+        self._names = names
+        self._clear_cache()
+
+    def _clear_cache(self):
+        """forget the data built from the old names"""
+        # the encoded tensors and the disk cache belong to the old names
+        self._training_data = None
+        self._known_names = None
+        self._split_names = None
+        self._splits = None
+        self.file_hash = None
+
+    @property
+    def known_names(self):
+        """the set of the names, built once to check if a name is in the data"""
+        if self._known_names is None:
+            self._known_names = frozenset(self.names)
+        return self._known_names
+
     def _read_file(self):
-        """read the file"""
-        with open(self.file_name, READ_MODE, encoding=ENCODING) as file:
-            return file.read().splitlines()
+        """read the file, return the names and the hash of the file content"""
+        if self.stream:
+            return MappedNames(self.file_name), hash_file(self.file_name)
+        with open(self.file_name, READ_MODE) as file:
+            content = file.read()
+        return (
+            content.decode(ENCODING).splitlines(),
+            hashlib.sha256(content).hexdigest(),
+        )
+
+    def _name_chunks(self):
+        """the names in lists, a list is one chunk of a streamed file"""
+        if isinstance(self.names, MappedNames):
+            return self.names.chunks()
+        return [self.names]
 
     def _build_vocab(self):
         """build the vocabulary"""
-        chars = sorted(list(set("".join(self.names))))
+        chars = set()
+        for names in self._name_chunks():
+            chars.update("".join(names))
+        chars = sorted(chars)
         char_to_int = {char: index + 1 for index, char in enumerate(chars)}
         char_to_int[START_END] = 0
         int_to_char = {index: char for char, index in char_to_int.items()}
@@ -32,17 +105,91 @@ class Data:
         return char_to_int, int_to_char, vocab_size
 
     def get_training_data(self):
-        """get the training data"""
-        first_indexes, next_indexes = [], []
-
-        for name in self.names:
-            chars = ["."] + list(name) + ["."]
-            for first_char, next_char in zip(chars, chars[1:]):
-                first_index = self.char_to_int[first_char]
-                next_index = self.char_to_int[next_char]
-                first_indexes.append(first_index)
-                next_indexes.append(next_index)
-
-        first_indexes = torch.tensor(first_indexes)
-        next_indexes = torch.tensor(next_indexes)
+        """get the training data
+
+        The tensors are built on the first call and the same tensors are returned
+        by later calls until `names` is assigned again.
+        """
+        if self._training_data is None:
+            self._training_data = self._load_training_data()
+        return self._training_data
+
+    def split_names(self):
+        """shuffle the names once, return the names of each split
+
+        A streamed file is read into a list to be shuffled.
+        """
+        if self._split_names is None:
+            names = list(self.names)
+            random.Random(SPLIT_SEED).shuffle(names)
+            train_end = int(TRAIN_RATIO * len(names))
+            dev_end = int((TRAIN_RATIO + DEV_RATIO) * len(names))
+            self._split_names = {
+                TRAIN: names[:train_end],
+                DEV: names[train_end:dev_end],
+                TEST: names[dev_end:],
+            }
+        return self._split_names
+
+    def get_split(self, split):
+        """get the first and the next indexes of the bigrams of the split"""
+        if self._splits is None:
+            self._splits = self._build_splits()
+        return self._splits[split]
+
+    def _build_splits(self):
+        """encode the bigrams of each split"""
+        return {
+            split: self._encode_names([names])
+            for split, names in self.split_names().items()
+        }
+
+    def _cache_file(self):
+        """the cache file of the encoded tensors, None if it should not be used"""
+        if self.cache_dir is None or self.file_hash is None:
+            return None
+        base_name = os.path.splitext(os.path.basename(self.file_name))[0]
+        return os.path.join(
+            self.cache_dir, f"{base_name}-{self.file_hash[:16]}{CACHE_SUFFIX}"
+        )
+
+    def _load_training_data(self):
+        """load the training data from the cache file or encode the names"""
+        cache_file = self._cache_file()
+        if cache_file is not None and os.path.exists(cache_file):
+            tensors = torch.load(cache_file)
+            return tensors["first_indexes"], tensors["next_indexes"]
+
+        first_indexes, next_indexes = self._encode_names()
+        if cache_file is not None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tensors = {"first_indexes": first_indexes, "next_indexes": next_indexes}
+            torch.save(tensors, cache_file)
+
         return first_indexes, next_indexes
+
+    def _encode_names(self, name_chunks=None):
+        """encode all bigrams of the names into two index tensors
+
+        By default the names of the data are encoded. The names of a chunk are
+        joined by `START_END` into one sequence like `.emma.olivia.`,
+        each pair of neighbours in the sequence is one bigram.
+        """
+        first_parts, next_parts = [], []
+        if name_chunks is None:
+            name_chunks = self._name_chunks()
+        for names in name_chunks:
+            if not names:
+                continue
+            indexes = self._encode_text(START_END + START_END.join(names) + START_END)
+            first_parts.append(indexes[:-1])
+            next_parts.append(indexes[1:])
+
+        if not first_parts:
+            empty = torch.zeros(0, dtype=torch.long)
+            return empty, empty.clone()
+        return torch.cat(first_parts), torch.cat(next_parts)
+
+    def _encode_text(self, text):
+        """encode the characters of the text into vocabulary indexes"""
+        return encode_text(text, self.char_to_int)
@@ -0,0 +1,23 @@
+"""Generate names from a saved checkpoint."""
+
+import argparse
+
+from checkpoint import load_checkpoint
+
+START_END = "."
+NUM_NAMES = 10
+
+
+def main():
+    """main function"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("checkpoint", help="the checkpoint file of a model")
+    parser.add_argument("--num-names", type=int, default=NUM_NAMES)
+    args = parser.parse_args()
+
+    model, _, int_to_char, _ = load_checkpoint(args.checkpoint)
+    model.generate_names(args.num_names, int_to_char, START_END)
+
+
+if __name__ == "__main__":
+    main()
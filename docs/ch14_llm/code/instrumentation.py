@@ -0,0 +1,168 @@
+"""module to measure the time and memory of the training."""
+
+import contextlib
+import csv
+import json
+import sys
+import time
+
+import torch
+
+DATA = "data"
+FORWARD = "forward"
+BACKWARD = "backward"
+UPDATE = "update"
+PHASES = (DATA, FORWARD, BACKWARD, UPDATE)
+
+BYTES_PER_MIB = 2**20
+# ru_maxrss is in KiB on Linux and in bytes on macOS
+RSS_BYTES = 1 if sys.platform == "darwin" else 1024
+BYTES_PER_KIB = 1024
+# writing 5 to clear_refs resets the peak RSS VmHWM to the current RSS VmRSS
+PROC_STATUS = "/proc/self/status"
+PROC_CLEAR_REFS = "/proc/self/clear_refs"
+RESET_PEAK_RSS = "5"
+
+
+def process_peak_rss_mib():
+    """the peak RSS of this process since it started, None if it is unknown
+
+    The `resource` module only exists on Unix, so it is imported here and
+    the instrumentation still works on Windows.
+    """
+    try:
+        import resource  # pylint: disable=import-outside-toplevel
+    except ImportError:
+        return None
+    return (
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * RSS_BYTES / BYTES_PER_MIB
+    )
+
+
+def _proc_status_mib(field):
+    """a memory field of `/proc/self/status` in MiB, None if it is unknown"""
+    try:
+        with open(PROC_STATUS, encoding="ascii") as file:
+            for line in file:
+                name, _, value = line.partition(":")
+                if name == field:
+                    return int(value.split()[0]) * BYTES_PER_KIB / BYTES_PER_MIB
+    except OSError:
+        pass
+    return None
+
+
+def reset_peak_rss():
+    """reset the peak RSS of this process to its RSS, return the RSS in MiB
+
+    Only Linux can reset the peak RSS, None is returned on other systems.
+    """
+    try:
+        with open(PROC_CLEAR_REFS, "w", encoding="ascii") as file:
+            file.write(RESET_PEAK_RSS)
+    except OSError:
+        return None
+    return _proc_status_mib("VmRSS")
+
+
+def peak_rss_mib():
+    """the peak RSS of this process since the last `reset_peak_rss`, in MiB"""
+    return _proc_status_mib("VmHWM")
+
+
+class TrainingMonitor:
+    """record the time of each phase and the memory of each iteration
+
+    A trainer calls `start_iteration`, wraps each phase in `phase(name)` and
+    calls `end_iteration` with the number of tokens of the iteration.
+    Each iteration gives one record with the seconds of every phase, the
+    tokens per second and, on a GPU, the peak tensor memory of the iteration.
+    The record also has `process_peak_rss_mib`, the peak RSS of the process
+    since it started, it only grows and is None where it is unknown.
+
+    GPU work runs asynchronously, set `synchronize=True` to wait for it at the
+    end of each phase so that the time is counted in the right phase.
+    """
+
+    def __init__(self, synchronize=False):
+        self.synchronize = synchronize and torch.cuda.is_available()
+        self.records = []
+        self._record = None
+        self._start = 0.0
+
+    def start_iteration(self, iteration):
+        """start the record of an iteration"""
+        self._record = {"iteration": iteration}
+        self._record.update({name: 0.0 for name in PHASES})
+        if torch.cuda.is_available():
+            torch.cuda.reset_peak_memory_stats()
+        self._start = time.perf_counter()
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """measure the time of a phase of the iteration"""
+        start = time.perf_counter()
+        yield
+        if self.synchronize:
+            torch.cuda.synchronize()
+        self._record[name] += time.perf_counter() - start
+
+    def end_iteration(self, num_tokens):
+        """finish the record of an iteration"""
+        seconds = time.perf_counter() - self._start
+        self._record["seconds"] = seconds
+        self._record["tokens"] = num_tokens
+        self._record["tokens_per_second"] = num_tokens / seconds if seconds else 0.0
+        self._record["process_peak_rss_mib"] = process_peak_rss_mib()
+        self._record["peak_tensor_mib"] = (
+            torch.cuda.max_memory_allocated() / BYTES_PER_MIB
+            if torch.cuda.is_available()
+            else None
+        )
+        self.records.append(self._record)
+        self._record = None
+
+    def summary(self):
+        """the total seconds of each phase and the average tokens per second"""
+        totals = {name: sum(record[name] for record in self.records) for name in PHASES}
+        seconds = sum(record["seconds"] for record in self.records)
+        tokens = sum(record["tokens"] for record in self.records)
+        totals["seconds"] = seconds
+        totals["tokens_per_second"] = tokens / seconds if seconds else 0.0
+        return totals
+
+    def export_csv(self, file_name):
+        """write the records to a CSV file"""
+        if not self.records:
+            return
+        with open(file_name, "w", newline="", encoding="utf-8") as file:
+            writer = csv.DictWriter(file, fieldnames=list(self.records[0]))
+            writer.writeheader()
+            writer.writerows(self.records)
+
+    def export_json(self, file_name):
+        """write the records and the summary to a JSON file"""
+        with open(file_name, "w", encoding="utf-8") as file:
+            json.dump(
+                {"summary": self.summary(), "records": self.records}, file, indent=2
+            )
+
+
+class NullMonitor:
+    """a monitor that records nothing, used when the instrumentation is off"""
+
+    # pylint: disable=unused-argument
+    _phase = contextlib.nullcontext()
+
+    def start_iteration(self, iteration):
+        """do nothing"""
+
+    def phase(self, name):
+        """do nothing"""
+        return self._phase
+
+    def end_iteration(self, num_tokens):
+        """do nothing"""
+
+
+NULL_MONITOR = NullMonitor()
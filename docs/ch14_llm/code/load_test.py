@@ -0,0 +1,116 @@
+"""A load generator for the name server, reports latency and throughput.
+
+python server.py bigram.pt &
+python load_test.py --endpoint generate --clients 64 --requests 50
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+
+from server import HOST, PORT
+
+CLIENTS = 32
+REQUESTS = 50
+NUM_NAMES = 10
+SCORE_NAMES = ["emma", "olivia", "ava", "xqzt", "sophia", "mia", "zzz", "liam"]
+
+
+def make_payload(endpoint, num_names):
+    """the body of one request"""
+    if endpoint == "generate":
+        return {"num_names": num_names}
+    return {"names": random.choices(SCORE_NAMES, k=num_names)}
+
+
+async def client(host, port, endpoint, num_requests, num_names, latencies):
+    """send the requests one after another on one kept-alive connection"""
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for _ in range(num_requests):
+            body = json.dumps(make_payload(endpoint, num_names)).encode("utf-8")
+            request = (
+                f"POST /{endpoint} HTTP/1.1\r\n"
+                f"Host: {host}\r\n"
+                "Content-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                "\r\n"
+            )
+            start = time.perf_counter()
+            writer.write(request.encode("latin-1") + body)
+            await writer.drain()
+
+            status_line = await reader.readline()
+            content_length = 0
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                if name.lower() == "content-length":
+                    content_length = int(value.strip())
+            await reader.readexactly(content_length)
+            latencies.append(time.perf_counter() - start)
+
+            if b" 200 " not in status_line:
+                raise RuntimeError(status_line.decode("latin-1").strip())
+    finally:
+        writer.close()
+
+
+async def run(host, port, endpoint, num_clients, num_requests, num_names):
+    """run all clients at once, print the latency percentiles and the throughput"""
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(
+        *(
+            client(host, port, endpoint, num_requests, num_names, latencies)
+            for _ in range(num_clients)
+        )
+    )
+    seconds = time.perf_counter() - start
+
+    percentiles = statistics.quantiles(latencies, n=100)
+    print(
+        f"{len(latencies)} requests in {seconds:.2f} s, "
+        f"{len(latencies) / seconds:,.0f} requests/s, "
+        f"{len(latencies) * num_names / seconds:,.0f} names/s"
+    )
+    print(
+        f"latency p50 {percentiles[49] * 1000:.2f} ms, "
+        f"p99 {percentiles[98] * 1000:.2f} ms"
+    )
+
+
+def main():
+    """main function"""
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--endpoint", choices=["generate", "score"], default="generate")
+    parser.add_argument("--clients", type=int, default=CLIENTS)
+    parser.add_argument("--requests", type=int, default=REQUESTS)
+    parser.add_argument(
+        "--num-names", type=int, default=NUM_NAMES, help="the names in each request"
+    )
+    args = parser.parse_args()
+
+    asyncio.run(
+        run(
+            args.host,
+            args.port,
+            args.endpoint,
+            args.clients,
+            args.requests,
+            args.num_names,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
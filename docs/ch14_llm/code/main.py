@@ -1,13 +1,14 @@
 """Main module for the program."""
 
+from checkpoint import save_checkpoint
 from data import Data, START_END
 from model import BigramLanguageModel
 from trainer import Trainer
 
-
 DATA_FILE = "names.txt"
 NUM_ITERATIONS = 101
 NUM_NAMES = 10
+CHECKPOINT_FILE = "bigram.pt"
 
 
 def main():
@@ -17,6 +18,7 @@ def main():
 
     trainer = Trainer(data, model)
     trainer.train(NUM_ITERATIONS)
+    save_checkpoint(CHECKPOINT_FILE, model, data.int_to_char, trainer)
     model.generate_names(NUM_NAMES, data.int_to_char, START_END)
 
 
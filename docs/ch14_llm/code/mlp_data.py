@@ -0,0 +1,62 @@
+"""module to handle the data of the MLP language model"""
+
+import torch
+
+from data import DEV, START_END, TEST, TRAIN, Data
+
+BLOCK_SIZE = 3
+SPLITS = (TRAIN, DEV, TEST)
+
+
+class MLPData(Data):
+    """class to handle the data of the MLP language model
+
+    Each example is a context of the previous `block_size` characters and the
+    next character. The names are split into the train, dev and test sets as
+    in `Data`, `get_split` gives the contexts and the next characters of a split.
+    """
+
+    def __init__(self, file_name, block_size=BLOCK_SIZE, cache_dir=None, stream=False):
+        self.block_size = block_size
+        super().__init__(file_name, cache_dir, stream)
+
+    def _build_splits(self):
+        """build the examples of all splits as views of one tensor
+
+        The names of the splits are encoded as one flat sequence, each name is
+        padded as `block_size * START_END + name + START_END`. Every window of
+        `block_size + 1` indexes that ends in a name is one example, its first
+        `block_size` indexes are the context and its last index is the next
+        character. The windows are a strided view of the sequence, the examples
+        are gathered from them once, in the order of the splits, so each split is
+        a slice of the same tensor and its contexts and next characters are
+        column views of the slice.
+        """
+        split_names = self.split_names()
+        names = [name for split in SPLITS for name in split_names[split]]
+        if not names:
+            empty = torch.zeros((0, self.block_size + 1), dtype=torch.long)
+            return {split: (empty[:, :-1], empty[:, -1]) for split in SPLITS}
+
+        padding = START_END * self.block_size
+        indexes = self._encode_text(
+            "".join(padding + name + START_END for name in names)
+        )
+
+        # each name has len(name) + 1 examples, they start at the padding of the name
+        num_examples = torch.tensor([len(name) + 1 for name in names])
+        name_starts = torch.cumsum(num_examples + self.block_size, dim=0) - (
+            num_examples + self.block_size
+        )
+        first_examples = torch.cumsum(num_examples, dim=0) - num_examples
+        name_ids = torch.repeat_interleave(torch.arange(len(names)), num_examples)
+        starts = name_starts[name_ids] + torch.arange(len(name_ids))
+        starts -= first_examples[name_ids]
+        examples = indexes.unfold(0, self.block_size + 1, 1)[starts]
+
+        splits, start = {}, 0
+        for split in SPLITS:
+            end = start + sum(len(name) + 1 for name in split_names[split])
+            splits[split] = examples[start:end, :-1], examples[start:end, -1]
+            start = end
+        return splits
@@ -0,0 +1,29 @@
+"""Main module for the MLP language model."""
+
+from checkpoint import save_checkpoint
+from mlp_data import START_END, MLPData
+from mlp_model import MLPLanguageModel
+from mlp_trainer import MLPTrainer
+
+DATA_FILE = "names.txt"
+NUM_STEPS = 10_000
+CHECKPOINT_FILE = "mlp.pt"
+NUM_NAMES = 10
+
+
+def main():
+    """main function"""
+    data = MLPData(DATA_FILE)
+    model = MLPLanguageModel(data.vocab_size, data.block_size)
+
+    trainer = MLPTrainer(data, model)
+    trainer.train(NUM_STEPS)
+    save_checkpoint(CHECKPOINT_FILE, model, data.int_to_char, trainer)
+    for split, loss in trainer.evaluate_splits().items():
+        print(f"{split} loss = {loss:.4f}")
+    for name in model.sample_names(NUM_NAMES, data.int_to_char, START_END):
+        print(name)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""module of the MLP language model."""
+
+import torch
+import torch.nn.functional as F
+
+MANUAL_SEED = 2147483647
+EMBEDDING_SIZE = 10
+HIDDEN_SIZE = 200
+BATCH_SIZE = 4096
+BUFFER_LENGTH = 32
+
+PARAMETER_NAMES = [
+    "embeddings",
+    "hidden_weights",
+    "hidden_bias",
+    "output_weights",
+    "output_bias",
+]
+
+
+class MLPLanguageModel:
+    """MLP language model.
+
+    Each character of the context is embedded into a vector, the vectors are
+    joined and passed through one tanh hidden layer to the logits of the next character.
+    """
+
+    def __init__(
+        self,
+        vocab_size,
+        block_size,
+        embedding_size=EMBEDDING_SIZE,
+        hidden_size=HIDDEN_SIZE,
+    ):
+        self.vocab_size = vocab_size
+        self.block_size = block_size
+        self.embedding_size = embedding_size
+        self.hidden_size = hidden_size
+
+        generator = torch.Generator().manual_seed(MANUAL_SEED)
+        input_size = block_size * embedding_size
+        self.embeddings = torch.randn((vocab_size, embedding_size), generator=generator)
+        self.hidden_weights = torch.randn(
+            (input_size, hidden_size), generator=generator
+        )
+        self.hidden_bias = torch.randn(hidden_size, generator=generator)
+        self.output_weights = torch.randn(
+            (hidden_size, vocab_size), generator=generator
+        )
+        self.output_bias = torch.randn(vocab_size, generator=generator)
+        for parameter in self.parameters():
+            parameter.requires_grad_()
+
+    def parameters(self):
+        """the list of the trainable parameters"""
+        return [getattr(self, name) for name in PARAMETER_NAMES]
+
+    def config(self):
+        """the arguments to create the same model"""
+        return {
+            "vocab_size": self.vocab_size,
+            "block_size": self.block_size,
+            "embedding_size": self.embedding_size,
+            "hidden_size": self.hidden_size,
+        }
+
+    def state_dict(self):
+        """the tensors of the model"""
+        return {name: getattr(self, name).detach() for name in PARAMETER_NAMES}
+
+    def load_state_dict(self, state):
+        """use the tensors of the model, the tensors are not copied"""
+        for name in PARAMETER_NAMES:
+            setattr(self, name, state[name].requires_grad_())
+
+    def to(self, device):
+        """move the parameters to the device
+
+        The parameters already on the device are kept, so an optimizer over
+        them still updates the model.
+        """
+        for name in PARAMETER_NAMES:
+            parameter = getattr(self, name)
+            if parameter.device != torch.device(device):
+                parameter = parameter.detach().to(device).requires_grad_()
+                setattr(self, name, parameter)
+        return self
+
+    def __call__(self, contexts):
+        """the logits of the next character for each context"""
+        embeddings = self.embeddings[contexts]
+        hidden = torch.tanh(
+            embeddings.view(-1, self.block_size * self.embedding_size)
+            @ self.hidden_weights
+            + self.hidden_bias
+        )
+        return hidden @ self.output_weights + self.output_bias
+
+    def logits(self, contexts):
+        """the logits of the next character, the same as calling the model"""
+        return self(contexts)
+
+    def generate_names(self, num_names, int_to_char, start_end):
+        """generate names one character at a time"""
+        generator = torch.Generator().manual_seed(MANUAL_SEED + 10)
+        with torch.no_grad():
+            for _ in range(num_names):
+                next_chars = []
+                context = [0] * self.block_size
+                while True:
+                    logits = self(torch.tensor([context]))
+                    probabilities = F.softmax(logits, dim=1)
+                    index = torch.multinomial(
+                        probabilities, num_samples=1, generator=generator
+                    ).item()
+                    context = context[1:] + [index]
+                    next_chars.append(int_to_char[index])
+                    if index == 0:
+                        break
+
+                print("".join(next_chars))
+
+    def sample_names(
+        self, num_names, int_to_char, start_end, batch_size=BATCH_SIZE, generator=None
+    ):
+        """sample names in batches, return them as a list of strings
+
+        The returned names do not include the ending `start_end` character.
+        """
+        if generator is None:
+            generator = torch.Generator(device=self.embeddings.device).manual_seed(
+                MANUAL_SEED + 10
+            )
+
+        chars = [int_to_char[index] for index in range(self.vocab_size)]
+        end_index = chars.index(start_end)
+        names = []
+        with torch.no_grad():
+            for start in range(0, num_names, batch_size):
+                size = min(batch_size, num_names - start)
+                names.extend(self._sample_batch(chars, end_index, size, generator))
+        return names
+
+    def _sample_batch(self, chars, end_index, size, generator):
+        """sample one batch of names
+
+        Every row of `history` is the padding of `block_size` end characters
+        followed by the characters sampled so far, so the contexts of the step
+        `step` are the window view `history[:, step : step + block_size]`,
+        no context is shifted or rebuilt. Only the rows of the running names
+        are gathered from the window, one small copy for each step.
+        The buffer is preallocated and grows by `BUFFER_LENGTH` characters
+        when a name gets longer.
+        The finished rows are masked out of the running rows.
+        """
+        device = self.embeddings.device
+        history = torch.full(
+            (size, self.block_size + BUFFER_LENGTH), end_index, device=device
+        )
+        lengths = torch.zeros(size, dtype=torch.long, device=device)
+        rows = torch.arange(size, device=device)
+
+        step = 0
+        while len(rows) > 0:
+            if self.block_size + step == history.shape[1]:
+                history = torch.cat(
+                    [
+                        history,
+                        torch.full((size, BUFFER_LENGTH), end_index, device=device),
+                    ],
+                    dim=1,
+                )
+            contexts = history[:, step : step + self.block_size][rows]
+            probabilities = F.softmax(self(contexts), dim=1)
+            indexes = torch.multinomial(probabilities, 1, generator=generator).squeeze(
+                1
+            )
+            history[rows, self.block_size + step] = indexes
+
+            running = indexes != end_index
+            lengths[rows[~running]] = step
+            rows = rows[running]
+            step += 1
+
+        sampled = history[:, self.block_size :].tolist()
+        return [
+            "".join(chars[index] for index in row[:length])
+            for row, length in zip(sampled, lengths.tolist())
+        ]
@@ -0,0 +1,199 @@
+"""Trainer class for training the MLP model."""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import torch
+import torch.nn.functional as F
+
+from instrumentation import BACKWARD, DATA, FORWARD, NULL_MONITOR, UPDATE
+from mlp_data import DEV, SPLITS, TRAIN
+from optimizer import SGD, CosineScheduler
+from trainer import autocast
+
+MANUAL_SEED = 2147483647
+BATCH_SIZE = 256
+LEARNING_RATE = 0.2
+MIN_LEARNING_RATE = 0.005
+LOG_EVERY = 1000
+EVAL_CHUNK_SIZE = 16_384
+
+
+class MLPTrainer:
+    """Trainer class of the MLP model
+
+    Each step trains on a random mini-batch of the train split.
+    By default the weights are updated by plain SGD and its learning rate
+    follows a cosine schedule from `learning_rate` down to `min_learning_rate`
+    over each call of `train`. An `optimizer` given here must be created over
+    the parameters of the model on `device`, it keeps its own learning rate
+    unless `scheduler` is given, whose `step()` then sets the learning rate of
+    each step, as in `Trainer`.
+    The loss stays on the device during the training, it is only read back
+    every `log_every` steps, so a GPU never waits for the host between the steps.
+
+    If `monitor` is given, it records the phases of every step, and
+    `autocast_dtype` runs the forward pass in a lower precision, see `Trainer`.
+    """
+
+    def __init__(
+        self,
+        data,
+        model,
+        batch_size=BATCH_SIZE,
+        learning_rate=LEARNING_RATE,
+        min_learning_rate=MIN_LEARNING_RATE,
+        device="cpu",
+        monitor=None,
+        autocast_dtype=None,
+        optimizer=None,
+        scheduler=None,
+    ):
+        self.data = data
+        self.model = model.to(device)
+        self.batch_size = batch_size
+        self.learning_rate = learning_rate
+        self.min_learning_rate = min_learning_rate
+        self.device = device
+        self.steps = 0
+        self.monitor = monitor or NULL_MONITOR
+        self.autocast_dtype = autocast_dtype
+        self.cosine_schedule = optimizer is None and scheduler is None
+        self.optimizer = optimizer or SGD(self.model.parameters(), learning_rate)
+        self.scheduler = scheduler
+
+    def _scheduler(self, num_steps):
+        """the learning rate scheduler of `num_steps` steps, None keeps the rate"""
+        if not self.cosine_schedule:
+            return self.scheduler
+        return CosineScheduler(
+            self.optimizer, num_steps, self.learning_rate, self.min_learning_rate
+        )
+
+    def train(self, num_steps, log_every=LOG_EVERY, early_stopping=None):
+        """train the model, return the average train loss of each log period
+
+        If `early_stopping` is given, e.g. an `optimizer.EarlyStopping`,
+        the dev loss is computed every `log_every` steps and the training stops
+        early when `early_stopping.update(dev_loss)` returns True.
+        """
+        contexts, next_indexes = self.data.get_split(TRAIN)
+        contexts = contexts.to(self.device)
+        next_indexes = next_indexes.to(self.device)
+        generator = torch.Generator(device=self.device).manual_seed(MANUAL_SEED)
+        scheduler = self._scheduler(num_steps)
+
+        monitor = self.monitor
+        losses = []
+        running_loss = torch.zeros((), device=self.device)
+        for step in range(num_steps):
+            monitor.start_iteration(self.steps + step)
+
+            with monitor.phase(DATA):
+                batch = torch.randint(
+                    0,
+                    len(contexts),
+                    (self.batch_size,),
+                    generator=generator,
+                    device=self.device,
+                )
+                batch_contexts = contexts[batch]
+                batch_next_indexes = next_indexes[batch]
+
+            with monitor.phase(FORWARD), autocast(self.autocast_dtype, self.device):
+                logits = self.model(batch_contexts)
+                loss = F.cross_entropy(logits, batch_next_indexes)
+
+            with monitor.phase(BACKWARD):
+                self.optimizer.zero_grad()
+                loss.backward()
+
+            with monitor.phase(UPDATE):
+                if scheduler is not None:
+                    scheduler.step()
+                self.optimizer.step()
+                with torch.no_grad():
+                    running_loss += loss
+
+            monitor.end_iteration(self.batch_size)
+
+            if (step + 1) % log_every == 0 or step + 1 == num_steps:
+                num_logged = (step % log_every) + 1
+                losses.append(running_loss.item() / num_logged)
+                print(
+                    f"Step {step + 1} loss = {losses[-1]:.4f} "
+                    f"lr = {self.optimizer.learning_rate:.4f}"
+                )
+                running_loss.zero_()
+
+                if early_stopping is not None and early_stopping.update(
+                    self.evaluate(DEV)
+                ):
+                    num_steps = step + 1
+                    print(f"Stopped early after {num_steps} steps")
+                    break
+
+        self.steps += num_steps
+        return losses
+
+    def state_dict(self):
+        """the state of the training, saved with the checkpoint"""
+        return {
+            "learning_rate": self.learning_rate,
+            "min_learning_rate": self.min_learning_rate,
+            "steps": self.steps,
+            "optimizer": self.optimizer.state_dict(),
+        }
+
+    def load_state_dict(self, state):
+        """continue the training from a saved state"""
+        self.learning_rate = state["learning_rate"]
+        self.min_learning_rate = state["min_learning_rate"]
+        self.steps = state["steps"]
+        if "optimizer" in state:
+            self.optimizer.load_state_dict(state["optimizer"])
+
+    def evaluate(self, split=DEV, chunk_size=EVAL_CHUNK_SIZE):
+        """the loss of the split
+
+        The split is run through the model in chunks of `chunk_size` examples
+        under `torch.inference_mode`, only the sum of the losses is kept,
+        so the memory does not grow with the size of the split.
+        """
+        contexts, next_indexes = self.data.get_split(split)
+        if len(contexts) == 0:
+            return float("nan")
+
+        with torch.inference_mode():
+            total = torch.zeros((), dtype=torch.double, device=self.device)
+            for start in range(0, len(contexts), chunk_size):
+                logits = self.model(
+                    contexts[start : start + chunk_size].to(self.device)
+                )
+                total += F.cross_entropy(
+                    logits,
+                    next_indexes[start : start + chunk_size].to(self.device),
+                    reduction="sum",
+                )
+            return total.item() / len(contexts)
+
+    def evaluate_splits(self, splits=SPLITS, chunk_size=EVAL_CHUNK_SIZE):
+        """the loss of each split, the splits are evaluated in parallel threads
+
+        PyTorch releases the GIL inside its operations, so the threads run the
+        chunks of the splits at the same time. The splits are built before the
+        threads start, and the intra-op threads of PyTorch are divided among the
+        splits during the evaluation, so the cores are not oversubscribed.
+        """
+        for split in splits:
+            self.data.get_split(split)
+
+        num_threads = torch.get_num_threads()
+        torch.set_num_threads(max(1, num_threads // len(splits)))
+        try:
+            with ThreadPoolExecutor(max_workers=len(splits)) as executor:
+                losses = executor.map(
+                    lambda split: self.evaluate(split, chunk_size), splits
+                )
+                return dict(zip(splits, losses))
+        finally:
+            torch.set_num_threads(num_threads)
@@ -3,25 +3,79 @@
 import torch
 import torch.nn.functional as F
 
+from scoring import score_strings, top_k
+
 MANUAL_SEED = 2147483647
+BATCH_SIZE = 4096
 
 
 class BigramLanguageModel:
-    """Bigram language model."""
+    """Bigram language model.
+
+    Multiplying a one-hot row by the weights selects one row of the weights,
+    so by default the model looks up the rows by index directly.
+    Set `one_hot=True` to use the one-hot matrix multiplication instead,
+    for example to check that both paths give the same results.
+    """
 
-    def __init__(self, vacab_size):
+    def __init__(self, vacab_size, one_hot=False):
         self.vacab_size = vacab_size
+        self.one_hot = one_hot
         generator = torch.Generator().manual_seed(MANUAL_SEED)
         self.weights = torch.randn(
             (vacab_size, vacab_size), generator=generator, requires_grad=True
         )
 
+    def parameters(self):
+        """the list of the trainable parameters"""
+        return [self.weights]
+
+    def config(self):
+        """the arguments to create the same model"""
+        return {"vacab_size": self.vacab_size, "one_hot": self.one_hot}
+
+    def state_dict(self):
+        """the tensors of the model"""
+        return {"weights": self.weights.detach()}
+
+    def load_state_dict(self, state):
+        """use the tensors of the model, the tensors are not copied"""
+        self.weights = state["weights"].requires_grad_()
+
+    def logits(self, first_indexes):
+        """the logits (log-counts) of the next character for each first character
+
+        Under `torch.autocast` the matrix multiplication of the one-hot path
+        runs in the lower precision by itself, the lookup is not an autocast
+        operation, so the rows it returns are cast to the autocast type.
+        """
+        if self.one_hot:
+            first_encodings = F.one_hot(first_indexes, self.vacab_size).float()
+            return first_encodings @ self.weights
+        logits = F.embedding(first_indexes, self.weights)
+        device_type = self.weights.device.type
+        if torch.is_autocast_enabled(device_type):
+            logits = logits.to(torch.get_autocast_dtype(device_type))
+        return logits
+
     def __call__(self, first_indexes):
-        first_encodings = F.one_hot(first_indexes, self.vacab_size).float()
-        logits = first_encodings @ self.weights
-        counts = logits.exp()
-        probabilities = counts / counts.sum(dim=1, keepdim=True)
-        return probabilities
+        logits = self.logits(first_indexes)
+        if self.one_hot:
+            counts = logits.exp()
+            probabilities = counts / counts.sum(dim=1, keepdim=True)
+            return probabilities
+        return F.softmax(logits, dim=1)
+
+    def score(self, strings, char_to_int, start_end, average=False):
+        """the log-likelihood of each string, see `scoring.score_strings`"""
+        with torch.no_grad():
+            log_prob = F.log_softmax(self.weights, dim=1)
+        return score_strings(log_prob, strings, char_to_int, start_end, average)
+
+    def top_k(self, strings, char_to_int, start_end, k, average=False):
+        """the `k` most plausible strings, as (string, log-likelihood) pairs"""
+        scores = self.score(strings, char_to_int, start_end, average)
+        return top_k(strings, scores, k)
 
     def generate_names(self, num_names, int_to_char, start_end):
         generator = torch.Generator().manual_seed(MANUAL_SEED)
@@ -55,3 +109,110 @@ class BigramLanguageModel:
                     break
 
             print("".join(next_chars))
+
+    def sample_names(
+        self,
+        num_names,
+        int_to_char,
+        start_end,
+        batch_size=BATCH_SIZE,
+        generator=None,
+        prefix="",
+    ):
+        """sample names in batches, return them as a list of strings
+
+        The cumulative probability table of each row is computed once.
+        Each step draws one uniform number for every unfinished name in the batch
+        and finds the next character by a binary search in its row,
+        the finished names are removed from the batch.
+        If `prefix` is given, every name starts with it and the chain starts
+        from its last character.
+        The returned names do not include the ending `start_end` character.
+        """
+        if generator is None:
+            generator = torch.Generator().manual_seed(MANUAL_SEED)
+
+        with torch.no_grad():
+            cumulative = F.softmax(self.weights, dim=1).cumsum(dim=1)
+        chars = [int_to_char[index] for index in range(self.vacab_size)]
+        end_index = chars.index(start_end)
+        if start_end in prefix or not set(prefix) <= set(chars):
+            raise ValueError(
+                f"the prefix {prefix!r} has a character out of the vocabulary"
+            )
+        start_index = chars.index(prefix[-1]) if prefix else end_index
+
+        names = []
+        for start in range(0, num_names, batch_size):
+            size = min(batch_size, num_names - start)
+            batch = self._sample_batch(
+                cumulative, chars, start_index, end_index, size, generator
+            )
+            names.extend(prefix + name for name in batch)
+        return names
+
+    def generate_novel_names(
+        self,
+        num_names,
+        int_to_char,
+        start_end,
+        known_names,
+        prefix="",
+        max_attempts=None,
+        generator=None,
+    ):
+        """sample `num_names` unique names that are not in `known_names`
+
+        `known_names` is a set such as `Data.known_names`, a lookup is O(1).
+        The names are sampled in batches until there are enough of them or
+        `max_attempts` names (by default 100 times `num_names`) have been sampled,
+        so the returned list can be shorter than `num_names`.
+        """
+        if max_attempts is None:
+            max_attempts = 100 * num_names
+        if generator is None:
+            generator = torch.Generator().manual_seed(MANUAL_SEED)
+
+        novel_names = {}
+        attempts = 0
+        while len(novel_names) < num_names and attempts < max_attempts:
+            missing = num_names - len(novel_names)
+            size = min(max(2 * missing, 64), BATCH_SIZE, max_attempts - attempts)
+            attempts += size
+            for name in self.sample_names(
+                size, int_to_char, start_end, generator=generator, prefix=prefix
+            ):
+                if name and name not in known_names:
+                    novel_names.setdefault(name, None)
+        # a dict keeps the order of the samples
+        return list(novel_names)[:num_names]
+
+    def _sample_batch(self, cumulative, chars, start_index, end_index, size, generator):
+        """sample one batch of names"""
+        rows = torch.arange(size)
+        indexes = torch.full((size,), start_index, dtype=torch.long)
+        lengths = torch.zeros(size, dtype=torch.long)
+        steps = []
+
+        step = 0
+        while len(rows) > 0:
+            uniforms = torch.rand((len(rows), 1), generator=generator)
+            indexes = torch.searchsorted(cumulative[indexes], uniforms).squeeze(1)
+            # rounding may leave the last cumulative value slightly below 1
+            indexes.clamp_(max=self.vacab_size - 1)
+
+            step_chars = torch.full((size,), end_index, dtype=torch.long)
+            step_chars[rows] = indexes
+            steps.append(step_chars)
+
+            running = indexes != end_index
+            lengths[rows[~running]] = step
+            rows = rows[running]
+            indexes = indexes[running]
+            step += 1
+
+        sampled = torch.stack(steps, dim=1).tolist()
+        return [
+            "".join(chars[index] for index in row[:length])
+            for row, length in zip(sampled, lengths.tolist())
+        ]
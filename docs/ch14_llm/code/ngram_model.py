@@ -0,0 +1,210 @@
+"""
+the count-based n-gram model with sparse counts
+"""
+
+# pylint: disable=C0103 # constant variable name is in upper case
+
+import torch
+
+from best_model import DATA_FILE, START_END, build_vocab, encode_text, read_file
+
+SMOOTHING = 1
+NUM_NAMES = 10
+MANUAL_SEED = 2147483647
+MAX_N = 5
+
+COUNT_BYTES = 4  # a dense count matrix uses int32
+
+
+class NGramModel:
+    """count-based n-gram model
+
+    Each name is padded as `(n - 1) * START_END + name + START_END`,
+    for `n = 2` it is the same `.name.` padding as the bigram model.
+
+    A dense count tensor has `vocab_size ** n` entries, most of them are zero.
+    Only the n-grams that appear are stored: every n-gram `(i_1, ..., i_n)` is
+    encoded as one integer `i_1 * V^(n-1) + ... + i_n`, the codes are kept sorted
+    in `keys` with their `counts`, and a code is found with a binary search.
+    The codes of the first `n - 1` indexes are the contexts, their total counts
+    are kept the same way in `context_keys` and `context_counts`.
+    """
+
+    def __init__(self, n, char_to_int, smoothing=SMOOTHING):
+        self.n = n
+        self.char_to_int = char_to_int
+        self.vocab_size = len(char_to_int)
+        self.smoothing = smoothing
+        if self.vocab_size**n >= 2**63:
+            raise ValueError(
+                f"{n}-gram codes of {self.vocab_size} chars overflow int64"
+            )
+
+        self.context_size = self.vocab_size ** (n - 1)
+        self.powers = self.vocab_size ** torch.arange(n - 1, -1, -1)
+        self.keys = torch.zeros(0, dtype=torch.long)
+        self.counts = torch.zeros(0, dtype=torch.long)
+        self.context_keys = torch.zeros(0, dtype=torch.long)
+        self.context_counts = torch.zeros(0, dtype=torch.long)
+
+    def encode_ngrams(self, names):
+        """encode all n-grams of the names, return the codes and the name of each code
+
+        All padded names are encoded as one sequence. Each name with `len(name)`
+        characters has `len(name) + 1` n-grams, they start at the beginning of the
+        padded name, so the n-grams never cross two names.
+        """
+        padding = START_END * (self.n - 1)
+        text = "".join(padding + name + START_END for name in names)
+        indexes = encode_text(text, self.char_to_int)
+
+        num_ngrams = torch.tensor([len(name) + 1 for name in names], dtype=torch.long)
+        name_ids = torch.repeat_interleave(torch.arange(len(names)), num_ngrams)
+        name_starts = (
+            torch.cumsum(num_ngrams + self.n - 1, dim=0) - num_ngrams - self.n + 1
+        )
+        first_ngrams = torch.cumsum(num_ngrams, dim=0) - num_ngrams
+        positions = torch.arange(len(name_ids)) - first_ngrams[name_ids]
+        starts = name_starts[name_ids] + positions
+
+        if len(starts) == 0:
+            return torch.zeros(0, dtype=torch.long), name_ids
+        windows = indexes.unfold(0, self.n, 1)[starts]
+        return windows @ self.powers, name_ids
+
+    def fit(self, names):
+        """count the n-grams of the names"""
+        codes, _ = self.encode_ngrams(names)
+        self.keys, self.counts = torch.unique(codes, sorted=True, return_counts=True)
+
+        # the keys are sorted, so the same contexts are next to each other
+        self.context_keys, inverse = torch.unique_consecutive(
+            self.keys // self.vocab_size, return_inverse=True
+        )
+        self.context_counts = torch.zeros(len(self.context_keys), dtype=torch.long)
+        self.context_counts.index_add_(0, inverse, self.counts)
+        return self
+
+    @staticmethod
+    def _lookup(keys, values, codes):
+        """the values of the codes, 0 for the codes that are not in the keys"""
+        if len(keys) == 0:
+            return torch.zeros_like(codes)
+        positions = torch.searchsorted(keys, codes).clamp_(max=len(keys) - 1)
+        found = keys[positions] == codes
+        return torch.where(found, values[positions], 0)
+
+    def probabilities(self, codes):
+        """the smoothed probability of each n-gram code"""
+        counts = self._lookup(self.keys, self.counts, codes)
+        context_counts = self._lookup(
+            self.context_keys, self.context_counts, codes // self.vocab_size
+        )
+        return (counts + self.smoothing).double() / (
+            context_counts + self.smoothing * self.vocab_size
+        ).double()
+
+    def next_probabilities(self, contexts):
+        """the smoothed probability rows of the next character for each context code"""
+        rows = torch.full(
+            (len(contexts), self.vocab_size), float(self.smoothing), dtype=torch.double
+        )
+
+        first_codes = contexts * self.vocab_size
+        lows = torch.searchsorted(self.keys, first_codes)
+        highs = torch.searchsorted(self.keys, first_codes + self.vocab_size)
+        num_entries = highs - lows
+        row_ids = torch.repeat_interleave(torch.arange(len(contexts)), num_entries)
+        first_entries = torch.cumsum(num_entries, dim=0) - num_entries
+        entries = lows[row_ids] + torch.arange(len(row_ids)) - first_entries[row_ids]
+        columns = self.keys[entries] % self.vocab_size
+        rows[row_ids, columns] += self.counts[entries].double()
+
+        return rows / rows.sum(dim=1, keepdim=True)
+
+    def sample_names(self, num_names, int_to_char, generator=None):
+        """sample names, all names advance together
+
+        The returned names do not include the ending `START_END` character.
+        """
+        if generator is None:
+            generator = torch.Generator().manual_seed(MANUAL_SEED)
+
+        outs = [[] for _ in range(num_names)]
+        rows = torch.arange(num_names)
+        contexts = torch.zeros(num_names, dtype=torch.long)
+
+        while len(rows) > 0:
+            probabilities = self.next_probabilities(contexts)
+            indexes = torch.multinomial(probabilities, 1, generator=generator)
+            indexes = indexes.squeeze(1)
+
+            running = indexes != 0
+            for row, index in zip(rows[running].tolist(), indexes[running].tolist()):
+                outs[row].append(int_to_char[index])
+
+            contexts = (contexts * self.vocab_size + indexes) % self.context_size
+            rows = rows[running]
+            contexts = contexts[running]
+
+        return ["".join(out) for out in outs]
+
+    def generate_names(self, int_to_char):
+        """generate names based on the n-gram probability"""
+        for name in self.sample_names(NUM_NAMES, int_to_char):
+            print(name + START_END)
+
+    def eval_model(self, names):
+        """the model quality, see `best_model.eval_model`
+
+        Return the `nll` of each name and the `nll` of the whole corpus.
+        """
+        if not names:
+            return torch.zeros(0), torch.tensor(float("nan"))
+
+        codes, name_ids = self.encode_ngrams(names)
+        ngram_nll = -torch.log(self.probabilities(codes))
+
+        num_ngrams = torch.bincount(name_ids, minlength=len(names))
+        name_nll = torch.zeros(len(names), dtype=torch.double)
+        name_nll.index_add_(0, name_ids, ngram_nll)
+        name_nll /= num_ngrams
+
+        return name_nll.float(), ngram_nll.mean().float()
+
+    def memory_bytes(self):
+        """the bytes used by the sparse counts"""
+        tensors = [self.keys, self.counts, self.context_keys, self.context_counts]
+        return sum(tensor.element_size() * tensor.nelement() for tensor in tensors)
+
+    def dense_memory_bytes(self):
+        """the bytes a dense count tensor would use"""
+        return COUNT_BYTES * self.vocab_size**self.n
+
+
+def memory_report(names, char_to_int, max_n=MAX_N):
+    """report the memory of the sparse counts and the loss for each n"""
+    for n in range(2, max_n + 1):
+        model = NGramModel(n, char_to_int).fit(names)
+        _, loss = model.eval_model(names)
+        print(
+            f"n={n}: {len(model.keys)} n-grams, "
+            f"sparse {model.memory_bytes() / 2**20:.2f} MiB, "
+            f"dense {model.dense_memory_bytes() / 2**20:.2f} MiB, "
+            f"loss {loss:.4f}"
+        )
+
+
+def main():
+    """main function"""
+    names = read_file(DATA_FILE)
+    char_to_int, int_to_char, _ = build_vocab(names)
+
+    memory_report(names, char_to_int)
+
+    model = NGramModel(3, char_to_int).fit(names)
+    model.generate_names(int_to_char)
+
+
+if __name__ == "__main__":
+    main()
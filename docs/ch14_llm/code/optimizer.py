@@ -0,0 +1,174 @@
+"""module of the optimizers, the learning rate scheduler and the early stopping.
+
+An optimizer updates any list of parameter tensors from their `.grad`,
+so the same optimizer works for the bigram and the MLP models.
+"""
+
+import math
+
+import torch
+
+BETAS = (0.9, 0.999)
+EPSILON = 1e-8
+PATIENCE = 3
+
+
+class Optimizer:
+    """the base class of the optimizers
+
+    `state` has one list of tensors for each kind of state, with one tensor
+    for each parameter, e.g. the velocities of SGD with momentum.
+    """
+
+    def __init__(self, parameters, learning_rate):
+        self.parameters = list(parameters)
+        self.learning_rate = learning_rate
+        self.num_steps = 0
+        self.state = {}
+
+    def zero_grad(self):
+        """forget the gradients of the last step"""
+        for parameter in self.parameters:
+            parameter.grad = None
+
+    def step(self):
+        """update the parameters from their gradients"""
+        with torch.no_grad():
+            self._update()
+        self.num_steps += 1
+
+    def _update(self):
+        """update the parameters in place"""
+        raise NotImplementedError
+
+    def _zeros(self, name):
+        """the state tensors of `name`, zero at the first step"""
+        if name not in self.state:
+            self.state[name] = [torch.zeros_like(p) for p in self.parameters]
+        return self.state[name]
+
+    def state_dict(self):
+        """the state of the optimizer, saved with the trainer"""
+        return {
+            "learning_rate": self.learning_rate,
+            "num_steps": self.num_steps,
+            "state": {name: list(tensors) for name, tensors in self.state.items()},
+        }
+
+    def load_state_dict(self, state):
+        """continue from a saved state, the state tensors are not copied"""
+        self.learning_rate = state["learning_rate"]
+        self.num_steps = state["num_steps"]
+        self.state = {
+            name: [
+                tensor.to(parameter.device)
+                for tensor, parameter in zip(tensors, self.parameters)
+            ]
+            for name, tensors in state["state"].items()
+        }
+
+
+class SGD(Optimizer):
+    """stochastic gradient descent, with momentum if `momentum` is more than 0
+
+    Without momentum every step is `parameter -= learning_rate * grad`.
+    With momentum the step follows the velocity, the sum of the past gradients
+    where each earlier gradient is multiplied once more by `momentum`.
+    """
+
+    def __init__(self, parameters, learning_rate, momentum=0.0):
+        super().__init__(parameters, learning_rate)
+        self.momentum = momentum
+
+    def _update(self):
+        if self.momentum == 0:
+            for parameter in self.parameters:
+                parameter -= self.learning_rate * parameter.grad
+            return
+
+        velocities = self._zeros("velocities")
+        for parameter, velocity in zip(self.parameters, velocities):
+            velocity.mul_(self.momentum).add_(parameter.grad)
+            parameter -= self.learning_rate * velocity
+
+
+class Adam(Optimizer):
+    """Adam, the moving averages of the gradients and of their squares
+    scale the step of each weight"""
+
+    def __init__(self, parameters, learning_rate, betas=BETAS, epsilon=EPSILON):
+        super().__init__(parameters, learning_rate)
+        self.betas = betas
+        self.epsilon = epsilon
+
+    def _update(self):
+        beta1, beta2 = self.betas
+        step = self.num_steps + 1
+        # the averages start at 0, the corrections remove that bias
+        correction1 = 1 - beta1**step
+        correction2 = 1 - beta2**step
+
+        means = self._zeros("means")
+        squares = self._zeros("squares")
+        for parameter, mean, square in zip(self.parameters, means, squares):
+            grad = parameter.grad
+            mean.mul_(beta1).add_(grad, alpha=1 - beta1)
+            square.mul_(beta2).addcmul_(grad, grad, value=1 - beta2)
+            denominator = (square / correction2).sqrt_().add_(self.epsilon)
+            parameter.addcdiv_(
+                mean, denominator, value=-self.learning_rate / correction1
+            )
+
+
+class CosineScheduler:
+    """set the learning rate of an optimizer along a cosine curve
+
+    The learning rate goes from `learning_rate` at the first step down to
+    `min_learning_rate` at the last of `num_steps` steps.
+    Call `step()` before each optimizer step.
+    """
+
+    def __init__(self, optimizer, num_steps, learning_rate, min_learning_rate):
+        self.optimizer = optimizer
+        self.num_steps = num_steps
+        self.learning_rate = learning_rate
+        self.min_learning_rate = min_learning_rate
+        self.steps = 0
+
+    def learning_rate_at(self, step):
+        """the learning rate of a step"""
+        progress = step / max(self.num_steps - 1, 1)
+        cosine = (1 + math.cos(math.pi * progress)) / 2
+        return (
+            self.min_learning_rate
+            + (self.learning_rate - self.min_learning_rate) * cosine
+        )
+
+    def step(self):
+        """set the learning rate of the next step"""
+        self.optimizer.learning_rate = self.learning_rate_at(self.steps)
+        self.steps += 1
+        return self.optimizer.learning_rate
+
+
+class EarlyStopping:
+    """stop the training when the dev loss stops improving
+
+    `update` is called with each dev loss, it returns True once the loss has not
+    improved by more than `min_delta` for `patience` evaluations in a row.
+    """
+
+    def __init__(self, patience=PATIENCE, min_delta=0.0):
+        self.patience = patience
+        self.min_delta = min_delta
+        self.best_loss = float("inf")
+        self.num_bad_evaluations = 0
+
+    def update(self, loss):
+        """record a dev loss, return True if the training should stop"""
+        if loss < self.best_loss - self.min_delta:
+            self.best_loss = loss
+            self.num_bad_evaluations = 0
+        else:
+            self.num_bad_evaluations += 1
+        return self.num_bad_evaluations >= self.patience
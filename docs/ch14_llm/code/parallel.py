@@ -0,0 +1,81 @@
+"""module to train the bigram model with many CPU processes."""
+
+import os
+
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+
+from data import Data
+from model import BigramLanguageModel
+from trainer import Trainer
+
+BACKEND = "gloo"
+MASTER_ADDR = "127.0.0.1"
+MASTER_PORT = "29500"
+THREADS_PER_WORKER = 1
+
+
+def train_parallel(
+    data_file,
+    num_workers,
+    num_iterations,
+    batch_size=None,
+    threads_per_worker=THREADS_PER_WORKER,
+    cache_dir=None,
+):
+    """train a bigram model with `num_workers` processes on this machine
+
+    Each worker process trains its shard of every batch, the gradients are
+    summed with the gloo backend. Return the trained weights.
+    """
+    data = Data(data_file, cache_dir)
+    weights = torch.zeros((data.vocab_size, data.vocab_size)).share_memory_()
+
+    os.environ.setdefault("MASTER_ADDR", MASTER_ADDR)
+    os.environ.setdefault("MASTER_PORT", MASTER_PORT)
+    mp.spawn(
+        _worker,
+        args=(
+            num_workers,
+            data_file,
+            num_iterations,
+            batch_size,
+            threads_per_worker,
+            cache_dir,
+            weights,
+        ),
+        nprocs=num_workers,
+        join=True,
+    )
+    return weights
+
+
+def _worker(
+    rank,
+    world_size,
+    data_file,
+    num_iterations,
+    batch_size,
+    threads_per_worker,
+    cache_dir,
+    weights,
+):
+    """train in one worker process, rank 0 copies the trained weights back"""
+    dist.init_process_group(BACKEND, rank=rank, world_size=world_size)
+    try:
+        data = Data(data_file, cache_dir)
+        model = BigramLanguageModel(data.vocab_size)
+        trainer = Trainer(
+            data,
+            model,
+            batch_size=batch_size,
+            num_threads=threads_per_worker,
+            rank=rank,
+            world_size=world_size,
+        )
+        trainer.train(num_iterations)
+        if rank == 0:
+            weights.copy_(model.weights.detach())
+    finally:
+        dist.destroy_process_group()
@@ -0,0 +1,155 @@
+"""module to store the weights of the models in fewer bits
+
+A float16 or bfloat16 tensor is the float32 tensor rounded to 16 bits.
+An int8 tensor keeps one scale and one offset for each row, every value of the
+row is mapped to one of 256 levels between the row minimum and maximum:
+
+    value ~= (quantized + 128) * scale + offset
+
+The tensors are stored quantized and only turned back into float32 when the
+model runs, so many models can be kept in memory at the same time.
+The computation itself is always float32.
+`python benchmark.py quantize` compares the loss, the speed and the size
+of each storage type.
+"""
+
+import torch
+import torch.nn.functional as F
+
+from model import BigramLanguageModel
+
+INT8 = "int8"
+FLOAT16 = "float16"
+BFLOAT16 = "bfloat16"
+FLOAT32 = "float32"
+DTYPES = {
+    FLOAT16: torch.float16,
+    BFLOAT16: torch.bfloat16,
+    INT8: torch.int8,
+}
+
+INT8_LEVELS = 255
+INT8_OFFSET = 128
+
+
+class QuantizedTensor:
+    """a float tensor stored as float16, bfloat16 or int8 with row scales"""
+
+    def __init__(self, values, scale=None, offset=None):
+        self.values = values
+        self.scale = scale
+        self.offset = offset
+
+    @classmethod
+    def quantize(cls, tensor, dtype):
+        """quantize a float tensor, a 1-D tensor is quantized as one row"""
+        tensor = tensor.detach().float()
+        if dtype != INT8:
+            return cls(tensor.to(DTYPES[dtype]))
+
+        rows = tensor.reshape(len(tensor), -1) if tensor.dim() > 1 else tensor[None]
+        low = rows.min(dim=1, keepdim=True).values
+        high = rows.max(dim=1, keepdim=True).values
+        # a constant row has a zero range, any scale maps it to its offset
+        scale = ((high - low) / INT8_LEVELS).clamp(min=torch.finfo(torch.float32).tiny)
+        values = torch.round((rows - low) / scale) - INT8_OFFSET
+        return cls(values.to(torch.int8).reshape(tensor.shape), scale, low)
+
+    @property
+    def dtype(self):
+        """the name of the storage type"""
+        return next(
+            name for name, dtype in DTYPES.items() if dtype == self.values.dtype
+        )
+
+    def dequantize(self):
+        """the float32 tensor"""
+        if self.scale is None:
+            return self.values.float()
+        values = self.values
+        rows = values.reshape(len(values), -1) if values.dim() > 1 else values[None]
+        rows = (rows.float() + INT8_OFFSET) * self.scale + self.offset
+        return rows.reshape(values.shape)
+
+    def state_dict(self):
+        """the tensors to save in a checkpoint"""
+        if self.scale is None:
+            return {"values": self.values}
+        return {"values": self.values, "scale": self.scale, "offset": self.offset}
+
+    @classmethod
+    def from_state_dict(cls, state):
+        """the quantized tensor of `state_dict`"""
+        return cls(state["values"], state.get("scale"), state.get("offset"))
+
+    def nbytes(self):
+        """the bytes of the stored tensors"""
+        tensors = [self.values] + ([] if self.scale is None else [self.scale] * 2)
+        return sum(tensor.element_size() * tensor.nelement() for tensor in tensors)
+
+
+def quantize_state(state, dtype):
+    """quantize every tensor of a model state"""
+    return {
+        name: QuantizedTensor.quantize(tensor, dtype) for name, tensor in state.items()
+    }
+
+
+def dequantize_state(state):
+    """the float32 tensors of a quantized model state"""
+    return {name: tensor.dequantize() for name, tensor in state.items()}
+
+
+def prepare_state(model):
+    """the state of the model to quantize
+
+    The weights of a bigram model are only used through a softmax of each row,
+    they are shifted to the log probabilities first, so that every row ends at 0
+    and has the same range as the table of `best_model`.
+    """
+    state = model.state_dict()
+    if isinstance(model, BigramLanguageModel):
+        state = {"weights": F.log_softmax(state["weights"], dim=1)}
+    return state
+
+
+class QuantizedModel:
+    """a bigram or MLP model with quantized weights
+
+    The model is rebuilt in float32 for each call and dropped afterwards,
+    only the quantized tensors are kept. The calls trade speed for memory,
+    every call pays for the dequantization of all tensors.
+    """
+
+    def __init__(self, model_class, config, state):
+        self.model_class = model_class
+        self.config = config
+        self.state = state
+
+    @classmethod
+    def quantize(cls, model, dtype):
+        """quantize the weights of a model"""
+        return cls(
+            type(model), model.config(), quantize_state(prepare_state(model), dtype)
+        )
+
+    def dequantize(self):
+        """the float32 model"""
+        model = self.model_class(**self.config)
+        with torch.no_grad():
+            model.load_state_dict(dequantize_state(self.state))
+        return model
+
+    def __call__(self, inputs):
+        """the output of the float32 model"""
+        with torch.no_grad():
+            return self.dequantize()(inputs)
+
+    def logits(self, inputs):
+        """the logits of the next character"""
+        with torch.no_grad():
+            return self.dequantize().logits(inputs)
+
+    def nbytes(self):
+        """the bytes of the stored tensors"""
+        return sum(tensor.nbytes() for tensor in self.state.values())
@@ -0,0 +1,52 @@
+"""module of the mini-batch sampler."""
+
+import torch
+
+MANUAL_SEED = 2147483647
+
+
+class BatchSampler:
+    """shuffled mini-batch sampler over the training tensors
+
+    The sampler streams batches forever. Each epoch visits the rows in a new
+    random order, the rows left over at the end of an epoch are skipped.
+    The batches are copied into buffers that are allocated once and reused,
+    so a batch is only valid until the next batch is taken.
+    The buffers use pinned memory when a GPU is available,
+    that makes the copy to the GPU faster.
+    """
+
+    def __init__(self, tensors, batch_size, generator=None):
+        self.tensors = tensors
+        self.num_rows = len(tensors[0])
+        self.batch_size = min(batch_size, self.num_rows)
+        if generator is None:
+            generator = torch.Generator().manual_seed(MANUAL_SEED)
+        self.generator = generator
+
+        pin_memory = torch.cuda.is_available()
+        self.buffers = tuple(
+            torch.empty(
+                (self.batch_size, *tensor.shape[1:]),
+                dtype=tensor.dtype,
+                pin_memory=pin_memory,
+            )
+            for tensor in tensors
+        )
+        self._order = torch.empty(0, dtype=torch.long)
+        self._position = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._position + self.batch_size > len(self._order):
+            self._order = torch.randperm(self.num_rows, generator=self.generator)
+            self._position = 0
+
+        indexes = self._order[self._position : self._position + self.batch_size]
+        self._position += self.batch_size
+
+        for tensor, buffer in zip(self.tensors, self.buffers):
+            torch.index_select(tensor, 0, indexes, out=buffer)
+        return self.buffers
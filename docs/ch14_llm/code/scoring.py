@@ -0,0 +1,55 @@
+"""module to score strings with a bigram log probability table."""
+
+import torch
+
+from corpus import encode_text
+
+
+def pack_strings(strings, char_to_int, start_end):
+    """pack the bigrams of all strings into index tensors
+
+    The strings are joined by `start_end` into one sequence like `.emma.olivia.`,
+    so a string of `len(string)` characters has `len(string) + 1` bigrams.
+    The characters that are not in the vocabulary get the index -1.
+    Return the first indexes, the next indexes, the string of each bigram and
+    the number of bigrams of each string.
+    """
+    text = start_end + start_end.join(strings) + start_end
+    indexes = encode_text(text, char_to_int, unknown_index=-1)
+
+    num_pairs = torch.tensor([len(string) + 1 for string in strings])
+    string_ids = torch.repeat_interleave(torch.arange(len(strings)), num_pairs)
+    return indexes[:-1], indexes[1:], string_ids, num_pairs
+
+
+def score_strings(log_prob, strings, char_to_int, start_end, average=False):
+    """the log-likelihood of each string under a bigram log probability table
+
+    The strings with a character out of the vocabulary get `-inf`.
+    If `average` is True, the log-likelihood is divided by the number of bigrams,
+    so that long strings are not ranked lower only because they are long.
+    """
+    if not strings:
+        return torch.zeros(0, dtype=torch.double)
+
+    first_indexes, next_indexes, string_ids, num_pairs = pack_strings(
+        strings, char_to_int, start_end
+    )
+    unknown = (first_indexes < 0) | (next_indexes < 0)
+    pair_log_prob = log_prob[first_indexes.clamp(min=0), next_indexes.clamp(min=0)]
+    pair_log_prob = pair_log_prob.double().masked_fill(unknown, float("-inf"))
+
+    scores = torch.zeros(len(strings), dtype=torch.double)
+    scores.index_add_(0, string_ids, pair_log_prob)
+    if average:
+        scores /= num_pairs
+    return scores
+
+
+def top_k(strings, scores, k):
+    """the `k` strings with the highest scores, as (string, score) pairs"""
+    values, positions = torch.topk(scores, min(k, len(strings)))
+    return [
+        (strings[position], value)
+        for position, value in zip(positions.tolist(), values.tolist())
+    ]
@@ -0,0 +1,284 @@
+"""A local HTTP server to generate and score names with a trained bigram model.
+
+    python main.py                 # train and save bigram.pt
+    python server.py bigram.pt     # serve it on http://127.0.0.1:8000
+
+    POST /generate  {"num_names": 5}            -> {"names": [...]}
+    POST /score     {"names": [...], "average": false}  -> {"scores": [...]}
+
+The requests that arrive within `--window` milliseconds are collected into one
+micro-batch, one vectorised sampling or scoring pass serves all of them.
+A score of a name with an unknown character is `null`.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+from concurrent.futures import ThreadPoolExecutor
+
+import torch
+
+from checkpoint import load_checkpoint
+
+START_END = "."
+MANUAL_SEED = 2147483647
+
+HOST = "127.0.0.1"
+PORT = 8000
+WINDOW_MS = 5
+MAX_BATCH_REQUESTS = 256
+MAX_NAMES = 10_000
+
+GENERATE = "/generate"
+SCORE = "/score"
+
+
+class HttpError(Exception):
+    """an error returned to the client with its HTTP status"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class MicroBatcher:
+    """collect concurrent requests and serve them with one batched call
+
+    `handle_batch` takes the list of request payloads and returns the list of
+    results in the same order. It runs in a worker thread so that the event
+    loop keeps accepting requests while a batch is computed.
+    """
+
+    def __init__(
+        self, handle_batch, window_ms=WINDOW_MS, max_requests=MAX_BATCH_REQUESTS
+    ):
+        self.handle_batch = handle_batch
+        self.window = window_ms / 1000
+        self.max_requests = max_requests
+        self.queue = asyncio.Queue()
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+    async def submit(self, payload):
+        """add a request to the next batch and wait for its result"""
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((payload, future))
+        return await future
+
+    async def run(self):
+        """serve the batches forever"""
+        loop = asyncio.get_running_loop()
+        while True:
+            requests = [await self.queue.get()]
+            deadline = loop.time() + self.window
+            while len(requests) < self.max_requests:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    requests.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            payloads = [payload for payload, _ in requests]
+            try:
+                results = await loop.run_in_executor(
+                    self.executor, self.handle_batch, payloads
+                )
+            except Exception as error:  # pylint: disable=broad-except
+                for _, future in requests:
+                    future.set_exception(error)
+                continue
+            for (_, future), result in zip(requests, results):
+                future.set_result(result)
+
+
+class NameService:
+    """the batched generate and score calls of a bigram model"""
+
+    def __init__(self, checkpoint_file):
+        self.model, self.char_to_int, self.int_to_char, _ = load_checkpoint(
+            checkpoint_file
+        )
+        if not all(hasattr(self.model, method) for method in ("sample_names", "score")):
+            raise ValueError(
+                f"{checkpoint_file} is not a checkpoint of a model that can "
+                "generate and score names, e.g. a bigram model"
+            )
+        self.generator = torch.Generator().manual_seed(MANUAL_SEED)
+
+    def generate(self, payloads):
+        """sample the names of all requests at once, then split them"""
+        names = self.model.sample_names(
+            sum(payload["num_names"] for payload in payloads),
+            self.int_to_char,
+            START_END,
+            generator=self.generator,
+        )
+        results, start = [], 0
+        for payload in payloads:
+            end = start + payload["num_names"]
+            results.append({"names": names[start:end]})
+            start = end
+        return results
+
+    def score(self, payloads):
+        """score the names of all requests at once, then split them"""
+        names = [name for payload in payloads for name in payload["names"]]
+        scores = self.model.score(names, self.char_to_int, START_END).tolist()
+        results, start = [], 0
+        for payload in payloads:
+            end = start + len(payload["names"])
+            request_scores = scores[start:end]
+            if payload.get("average", False):
+                request_scores = [
+                    score / (len(name) + 1)
+                    for name, score in zip(payload["names"], request_scores)
+                ]
+            results.append(
+                {
+                    "scores": [
+                        score if math.isfinite(score) else None
+                        for score in request_scores
+                    ]
+                }
+            )
+            start = end
+        return results
+
+
+def validate(path, payload):
+    """check the payload of a request"""
+    if not isinstance(payload, dict):
+        raise HttpError(400, "the body must be a JSON object")
+    if path == GENERATE:
+        num_names = payload.get("num_names")
+        # bool is a subclass of int, `true` is not a number of names
+        if (
+            not isinstance(num_names, int)
+            or isinstance(num_names, bool)
+            or not 0 < num_names <= MAX_NAMES
+        ):
+            raise HttpError(400, f"num_names must be an integer in 1..{MAX_NAMES}")
+    else:
+        names = payload.get("names")
+        if not isinstance(names, list) or not all(
+            isinstance(name, str) for name in names
+        ):
+            raise HttpError(400, "names must be a list of strings")
+
+
+async def read_request(reader):
+    """read one HTTP request, return the method, the path and the body"""
+    request_line = await reader.readline()
+    if not request_line:
+        return None
+    method, path, _ = request_line.decode("latin-1").split(" ", 2)
+
+    content_length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        if name.strip().lower() == "content-length":
+            content_length = int(value.strip())
+
+    body = await reader.readexactly(content_length) if content_length else b""
+    return method, path, body
+
+
+def write_response(writer, status, payload):
+    """write one JSON HTTP response, the connection is kept alive"""
+    body = json.dumps(payload).encode("utf-8")
+    reason = {
+        200: "OK",
+        400: "Bad Request",
+        404: "Not Found",
+        500: "Internal Server Error",
+    }.get(status, "Error")
+    header = (
+        f"HTTP/1.1 {status} {reason}\r\n"
+        "Content-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        "\r\n"
+    )
+    writer.write(header.encode("latin-1") + body)
+
+
+def make_handler(batchers):
+    """the connection handler that sends each request to its micro-batcher"""
+
+    async def handle(reader, writer):
+        try:
+            while True:
+                request = await read_request(reader)
+                if request is None:
+                    break
+                method, path, body = request
+                try:
+                    if method != "POST" or path not in batchers:
+                        raise HttpError(404, f"unknown endpoint {method} {path}")
+                    try:
+                        payload = json.loads(body or b"{}")
+                    except json.JSONDecodeError as error:
+                        raise HttpError(400, "the body is not valid JSON") from error
+                    validate(path, payload)
+                    try:
+                        result = await batchers[path].submit(payload)
+                    except Exception as error:  # pylint: disable=broad-except
+                        raise HttpError(
+                            500, f"{type(error).__name__}: {error}"
+                        ) from error
+                    write_response(writer, 200, result)
+                except HttpError as error:
+                    write_response(writer, error.status, {"error": str(error)})
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    return handle
+
+
+async def serve(checkpoint_file, host=HOST, port=PORT, window_ms=WINDOW_MS):
+    """load the model once and serve the requests"""
+    service = NameService(checkpoint_file)
+    batchers = {
+        GENERATE: MicroBatcher(service.generate, window_ms),
+        SCORE: MicroBatcher(service.score, window_ms),
+    }
+    tasks = [asyncio.create_task(batcher.run()) for batcher in batchers.values()]
+
+    server = await asyncio.start_server(make_handler(batchers), host, port)
+    print(f"serving {checkpoint_file} on http://{host}:{port}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def main():
+    """main function"""
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("checkpoint", help="the checkpoint file of a bigram model")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument(
+        "--window", type=float, default=WINDOW_MS, help="the batch window in ms"
+    )
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args.checkpoint, args.host, args.port, args.window))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+"""hyperparameter sweep of the MLP language model
+
+    python sweep.py grid --num-steps 5000
+    python sweep.py random --num-trials 20 --workers 4 --output sweep.csv
+    python sweep.py grid --space '{"block_size": [3, 5], "hidden_size": [100, 300]}'
+
+The trials are trained at the same time in a process pool, each worker uses
+`--threads` PyTorch threads, by default the cores are shared by the workers.
+Every `--eval-every` steps a trial computes its dev loss, it stops early when
+the dev loss stops improving or when it is worse than the best dev loss of all
+trials at the same step by more than `--margin`. The margin is only checked
+after `--min-evaluations` evaluations, the early losses of the trials are too
+close to tell a slow start from a weak trial.
+The results are written to a CSV file sorted by the dev loss.
+"""
+
+import argparse
+import contextlib
+import csv
+import io
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from mlp_data import DEV, TRAIN, MLPData
+from mlp_model import MLPLanguageModel
+from mlp_trainer import MLPTrainer
+from optimizer import EarlyStopping
+from trainer import set_num_threads
+
+DATA_FILE = "names.txt"
+OUTPUT_FILE = "sweep.csv"
+GRID = "grid"
+RANDOM = "random"
+
+SEARCH_SPACE = {
+    "block_size": [3, 4],
+    "embedding_size": [10, 16],
+    "hidden_size": [100, 200],
+    "batch_size": [64, 256],
+    "learning_rate": [0.1, 0.2],
+    "min_learning_rate": [0.005],
+}
+NUM_STEPS = 5000
+NUM_TRIALS = 10
+EVAL_EVERY = 500
+PATIENCE = 2
+MARGIN = 0.1
+MIN_EVALUATIONS = 3
+SEARCH_SEED = 42
+
+
+def grid_trials(space):
+    """every combination of the values of the search space"""
+    names = list(space)
+    return [dict(zip(names, values)) for values in itertools.product(*space.values())]
+
+
+def random_trials(space, num_trials, seed=SEARCH_SEED):
+    """`num_trials` distinct random combinations of the values of the search space"""
+    trials = grid_trials(space)
+    random.Random(seed).shuffle(trials)
+    return trials[:num_trials]
+
+
+class WeakTrialStopping(EarlyStopping):
+    """stop a trial that stops improving or that is clearly behind the others
+
+    `best_losses` is a dict shared by the workers, it maps the index of an
+    evaluation to the best dev loss of all trials at that evaluation.
+    A trial is only compared with the others from its `min_evaluations`-th
+    evaluation on.
+    """
+
+    def __init__(
+        self,
+        best_losses,
+        margin=MARGIN,
+        patience=PATIENCE,
+        min_evaluations=MIN_EVALUATIONS,
+    ):
+        super().__init__(patience)
+        self.best_losses = best_losses
+        self.margin = margin
+        self.min_evaluations = min_evaluations
+        self.num_evaluations = 0
+        self.weak = False
+
+    def update(self, loss):
+        index = self.num_evaluations
+        self.num_evaluations += 1
+        # the read and the write are not atomic, a lost update only delays a stop
+        best_loss = min(self.best_losses.get(index, float("inf")), loss)
+        self.best_losses[index] = best_loss
+        self.weak = (
+            self.num_evaluations >= self.min_evaluations
+            and loss > best_loss + self.margin
+        )
+        return super().update(loss) or self.weak
+
+
+def run_trial(
+    config,
+    data_file,
+    num_steps,
+    num_threads,
+    eval_every,
+    best_losses,
+    margin,
+    min_evaluations,
+):
+    """train one trial in a worker, return its results"""
+    set_num_threads(num_threads)
+    data = MLPData(data_file, config["block_size"])
+    model = MLPLanguageModel(
+        data.vocab_size,
+        data.block_size,
+        config["embedding_size"],
+        config["hidden_size"],
+    )
+    trainer = MLPTrainer(
+        data,
+        model,
+        config["batch_size"],
+        config["learning_rate"],
+        config["min_learning_rate"],
+    )
+    early_stopping = WeakTrialStopping(
+        best_losses, margin, min_evaluations=min_evaluations
+    )
+
+    start = time.perf_counter()
+    # the trainer prints every log period, the workers would mix their lines
+    with contextlib.redirect_stdout(io.StringIO()):
+        trainer.train(num_steps, eval_every, early_stopping)
+    seconds = time.perf_counter() - start
+
+    if early_stopping.weak:
+        stopped = "weak"
+    elif trainer.steps < num_steps:
+        stopped = "plateau"
+    else:
+        stopped = "no"
+    losses = trainer.evaluate_splits((TRAIN, DEV))
+    return {
+        **config,
+        "steps": trainer.steps,
+        "stopped": stopped,
+        "train_loss": losses[TRAIN],
+        "dev_loss": losses[DEV],
+        "seconds": seconds,
+    }
+
+
+def run_sweep(
+    trials,
+    data_file=DATA_FILE,
+    num_steps=NUM_STEPS,
+    num_workers=None,
+    num_threads=None,
+    eval_every=EVAL_EVERY,
+    margin=MARGIN,
+    min_evaluations=MIN_EVALUATIONS,
+):
+    """train the trials in a process pool, return the results sorted by dev loss"""
+    num_workers = num_workers or os.cpu_count()
+    num_threads = num_threads or max(os.cpu_count() // num_workers, 1)
+
+    # spawn instead of fork, a forked PyTorch thread pool can hang
+    context = multiprocessing.get_context("spawn")
+    results = []
+    with context.Manager() as manager:
+        best_losses = manager.dict()
+        with ProcessPoolExecutor(num_workers, mp_context=context) as pool:
+            futures = [
+                pool.submit(
+                    run_trial,
+                    config,
+                    data_file,
+                    num_steps,
+                    num_threads,
+                    eval_every,
+                    best_losses,
+                    margin,
+                    min_evaluations,
+                )
+                for config in trials
+            ]
+            for future in as_completed(futures):
+                result = future.result()
+                results.append(result)
+                print(
+                    f"trial {len(results)}/{len(trials)}: "
+                    f"dev loss {result['dev_loss']:.4f} after {result['steps']} steps, "
+                    f"{json.dumps({name: result[name] for name in trials[0]})}"
+                )
+
+    return sorted(results, key=lambda result: result["dev_loss"])
+
+
+def write_results(results, file_name):
+    """write the results to a CSV file"""
+    if not results:
+        return
+    with open(file_name, "w", newline="", encoding="utf-8") as file:
+        writer = csv.DictWriter(file, fieldnames=list(results[0]))
+        writer.writeheader()
+        writer.writerows(results)
+
+
+def main():
+    """main function"""
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("search", choices=[GRID, RANDOM])
+    parser.add_argument(
+        "--space", type=json.loads, default={}, help="JSON values to search"
+    )
+    parser.add_argument("--num-trials", type=int, default=NUM_TRIALS)
+    parser.add_argument("--num-steps", type=int, default=NUM_STEPS)
+    parser.add_argument("--eval-every", type=int, default=EVAL_EVERY)
+    parser.add_argument("--margin", type=float, default=MARGIN)
+    parser.add_argument("--min-evaluations", type=int, default=MIN_EVALUATIONS)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--data", default=DATA_FILE)
+    parser.add_argument("--output", default=OUTPUT_FILE)
+    args = parser.parse_args()
+
+    space = {**SEARCH_SPACE, **args.space}
+    if args.search == GRID:
+        trials = grid_trials(space)
+    else:
+        trials = random_trials(space, args.num_trials)
+
+    results = run_sweep(
+        trials,
+        args.data,
+        args.num_steps,
+        args.workers,
+        args.threads,
+        args.eval_every,
+        args.margin,
+        args.min_evaluations,
+    )
+    write_results(results, args.output)
+    if results:
+        print(f"best of {len(results)} trials: {results[0]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,114 @@
 """Trainer class for training the model."""
 
+import itertools
+
 import torch
+import torch.distributed as dist
+import torch.nn.functional as F
+
+from data import DEV, TRAIN
+from instrumentation import BACKWARD, DATA, FORWARD, NULL_MONITOR, UPDATE
+from optimizer import SGD
+from sampler import BatchSampler
+
+LEARNING_RATE = 50
+EVAL_EVERY = 10
 
 
 class Trainer:
-    """Trainer class"""
+    """Trainer class
+
+    By default every iteration is one gradient descent step over all bigrams.
+    If `batch_size` is given, every iteration is one step over a shuffled
+    mini-batch of `batch_size` bigrams.
+
+    `num_threads` and `num_interop_threads` set the intra-op and inter-op
+    thread counts of PyTorch, the defaults keep the PyTorch choice.
+
+    If `world_size` is more than 1, the trainer is one of `world_size` processes
+    of an initialized `torch.distributed` process group, see `parallel.py`.
+    All processes see the same batch, each computes the gradient of its own
+    shard of the batch and the gradients are summed with `all_reduce`,
+    so every process makes the same update as a single process would.
+
+    If `monitor` is given, for example an `instrumentation.TrainingMonitor`,
+    it records the time of the data, forward, backward and update phases,
+    the throughput and the memory of every iteration.
+
+    The weights are updated by `optimizer`, any optimizer of `optimizer.py`
+    over `model.parameters()`, by default plain SGD with `learning_rate`.
+    If `scheduler` is given, its `step()` sets the learning rate of each iteration.
+
+    If `autocast_dtype` is given, for example `torch.bfloat16`, the forward pass
+    runs under `torch.autocast`: the operations that allow it compute in the
+    lower precision, the weights and their updates stay float32.
+    """
 
-    def __init__(self, data, model):
+    def __init__(
+        self,
+        data,
+        model,
+        batch_size=None,
+        learning_rate=LEARNING_RATE,
+        num_threads=None,
+        num_interop_threads=None,
+        rank=0,
+        world_size=1,
+        monitor=None,
+        autocast_dtype=None,
+        optimizer=None,
+        scheduler=None,
+    ):
         self.data = data
         self.model = model
+        self.batch_size = batch_size
+        self.optimizer = optimizer or SGD(model.parameters(), learning_rate)
+        self.scheduler = scheduler
+        self.rank = rank
+        self.world_size = world_size
+        self.iterations = 0
+        self.monitor = monitor or NULL_MONITOR
+        self.autocast_dtype = autocast_dtype
+        set_num_threads(num_threads, num_interop_threads)
 
-    def train(self, num_iterations):
-        """train the model"""
+    @property
+    def learning_rate(self):
+        """the learning rate of the optimizer"""
+        return self.optimizer.learning_rate
 
+    def _batches(self, training_data):
+        """the training data for each iteration"""
+        if self.batch_size is None:
+            return itertools.repeat(training_data)
+        return BatchSampler(training_data, self.batch_size)
+
+    def _shard(self, tensor):
+        """the part of the batch trained by this process"""
+        return torch.tensor_split(tensor, self.world_size)[self.rank]
+
+    def train(self, num_iterations, early_stopping=None, eval_every=EVAL_EVERY):
+        """train the model, return the number of iterations
+
+        If `early_stopping` is given, e.g. an `optimizer.EarlyStopping`,
+        the model is trained on the train split instead of all names,
+        the dev loss is computed every `eval_every` iterations and the training
+        stops early when `early_stopping.update(dev_loss)` returns True.
+        """
+
+        monitor = self.monitor
+        if early_stopping is None:
+            batches = self._batches(self.data.get_training_data())
+        else:
+            batches = self._batches(self.data.get_split(TRAIN))
         for iteration in range(num_iterations):
-            first_indexes, next_indexes = self.data.get_training_data()
-            probabilities = self.model(first_indexes)
+            monitor.start_iteration(self.iterations + iteration)
 
-            num_inputs = len(first_indexes)
+            with monitor.phase(DATA):
+                first_indexes, next_indexes = next(batches)
+                batch_size = len(first_indexes)
+                if self.world_size > 1:
+                    first_indexes = self._shard(first_indexes)
+                    next_indexes = self._shard(next_indexes)
 
             # nlls = torch.zeros(num_inputs)
             # for index in range(num_inputs):
@@ -28,14 +119,102 @@ class Trainer:
 
             # print(f"average negative log likelihood, i.e. loss =  {nlls.mean().item():.4f}")
 
-            loss = -probabilities[torch.arange(num_inputs), next_indexes].log().mean()
-
-            if iteration % 10 == 0:
-                print(f"Iteration {iteration} loss =  {loss.item():.4f}")
+            with monitor.phase(FORWARD), autocast(self.autocast_dtype):
+                loss = self._loss(first_indexes, next_indexes)
+                if self.world_size > 1:
+                    # the shard losses add up to the loss of the whole batch
+                    loss = loss * (len(first_indexes) / batch_size)
 
             # backward pass
-            self.model.weights.grad = None
-            loss.backward()
+            with monitor.phase(BACKWARD):
+                self.optimizer.zero_grad()
+                loss.backward()
+                if self.world_size > 1:
+                    for parameter in self.optimizer.parameters:
+                        dist.all_reduce(parameter.grad)
+
+            if iteration % 10 == 0:
+                loss = loss.detach()
+                if self.world_size > 1:
+                    dist.all_reduce(loss)
+                if self.rank == 0:
+                    print(f"Iteration {iteration} loss =  {loss.item():.4f}")
 
             # update the weights
-            self.model.weights.data -= 50 * self.model.weights.grad
+            with monitor.phase(UPDATE):
+                if self.scheduler is not None:
+                    self.scheduler.step()
+                self.optimizer.step()
+
+            monitor.end_iteration(len(first_indexes))
+
+            if (
+                early_stopping is not None
+                and (iteration + 1) % eval_every == 0
+                and early_stopping.update(self.evaluate(DEV))
+            ):
+                num_iterations = iteration + 1
+                if self.rank == 0:
+                    print(f"Stopped early after {num_iterations} iterations")
+                break
+
+        self.iterations += num_iterations
+        return num_iterations
+
+    def evaluate(self, split=DEV):
+        """the loss of the split, every process computes the same loss"""
+        first_indexes, next_indexes = self.data.get_split(split)
+        with torch.no_grad():
+            return self._loss(first_indexes, next_indexes).item()
+
+    def state_dict(self):
+        """the state of the training, saved with the checkpoint"""
+        return {
+            "learning_rate": self.learning_rate,
+            "iterations": self.iterations,
+            "optimizer": self.optimizer.state_dict(),
+        }
+
+    def load_state_dict(self, state):
+        """continue the training from a saved state"""
+        self.iterations = state["iterations"]
+        if "optimizer" in state:
+            self.optimizer.load_state_dict(state["optimizer"])
+        else:
+            self.optimizer.learning_rate = state["learning_rate"]
+
+    def _loss(self, first_indexes, next_indexes):
+        """the average negative log likelihood of the next characters
+
+        `F.cross_entropy` computes the log-softmax of the logits and the
+        negative log likelihood in one numerically stable step.
+        The model with `one_hot=True` uses the `exp()/sum()/log()` steps instead.
+        """
+        if self.model.one_hot:
+            probabilities = self.model(first_indexes)
+            num_inputs = len(first_indexes)
+            return -probabilities[torch.arange(num_inputs), next_indexes].log().mean()
+
+        return F.cross_entropy(self.model.logits(first_indexes), next_indexes)
+
+
+def autocast(dtype, device="cpu"):
+    """the autocast context of the forward pass, it does nothing if `dtype` is None"""
+    return torch.autocast(
+        torch.device(device).type, dtype=dtype, enabled=dtype is not None
+    )
+
+
+def set_num_threads(num_threads=None, num_interop_threads=None):
+    """set the intra-op and inter-op thread counts of PyTorch
+
+    The inter-op thread count can only be set before PyTorch runs any
+    inter-op parallel work, so it is only set when it changes.
+    """
+    if num_threads is not None:
+        torch.set_num_threads(num_threads)
+    if (
+        num_interop_threads is not None
+        and num_interop_threads != torch.get_num_interop_threads()
+    ):
+        torch.set_num_interop_threads(num_interop_threads)